@@ -132,6 +132,16 @@ def test_charset_negate_range(minchar, maxchar):
     assert reversed_charset < minchar or maxchar < reversed_charset
 
 
+@pytest.mark.randomize(ncalls=DEFAULT_TESTS_COUNT,
+                       minchar=str, maxchar=str,
+                       fixed_length=1, str_attrs=('ascii_letters',))
+def test_charset_negate_range__ignorecase(minchar, maxchar):
+    minchar, maxchar = min(minchar, maxchar), max(minchar, maxchar)
+    charset_re = re.compile('[^%s-%s]' % (minchar, maxchar), re.IGNORECASE)
+    reversed_charset = unmatcher.reverse(charset_re)
+    assert charset_re.match(reversed_charset)
+
+
 @pytest.mark.parametrize('class_', ('w', 'd', 's'))
 def test_charset_negate_class(class_):
     charset_re = re.compile(r'\%s' % class_.upper())
@@ -322,18 +332,385 @@ def test_named_group_condition_with_value(groupname, condgroup, yesgroup):
                                                         (None, "")]
 
 
-@pytest.mark.parametrize('case', [
-    ('assert', 'abc(?=def)'),  # lookahead assertion
-    ('assert_not', 'abc(?!def)'),  # negative lookahead assertion
-    ('assert', '(?<=abc)def'),  # lookbehind assertion
-    ('assert_not', '(?<!abc)def'),  # negative lookbehind assertion
+@pytest.mark.parametrize('regex', [
+    r'(?=.*\d)(?=.*[A-Z])\w{8,16}',  # typical password rule
+    r'(?=.*[^a-z])[a-z]+\d',
+    r'(?=[a-f]{3})\w{3,6}',
+    r'abc(?!def)\w{3}',  # negative lookahead assertion
+    r'(?!.*\d)\w{40}',
+    r'[ab]{2}(?<=a.)def',  # lookbehind assertion
+    r'\w{3}(?<!abc)def',  # negative lookbehind assertion
+])
+def test_assertions(regex):
+    the_re = re.compile(regex)
+    for _ in range(SMALL_TESTS_COUNT):
+        reversed_re = unmatcher.reverse(the_re)
+        match = the_re.match(reversed_re)
+        assert bool(match)
+        assert match.end() == len(reversed_re)
+
+
+@pytest.mark.parametrize('regex', [
+    'abc(?=def)',  # lookahead past the end of string
+    '(?<=abc)def',  # lookbehind past the beginning of string
+])
+def test_unsatisfiable_assertions(regex):
+    with pytest.raises(unmatcher.ReversalError):
+        unmatcher.reverse(regex)
+
+
+def test_assertion_stats():
+    unmatcher.assertion_stats.reset()
+    unmatcher.reverse(r'(?=.*\d)\w+')
+    assert unmatcher.assertion_stats.reversals == 1
+    assert unmatcher.assertion_stats.attempts >= 1
+    assert 0 < unmatcher.assertion_stats.success_rate <= 1
+
+
+@pytest.mark.parametrize('regex', [
+    r'(?!.*[\d_])\w{40}',
+    r'(?![\d_])\w\d',  # excludes charset from the next character only
+    r'(?=.?a)\w{3}',  # bounded repeat is assumed to repeat minimum times
+    r'(?=.*ab\d)\w{10}',  # sequence required somewhere in the string    r'(?!\d\d)\d\w{3}',  # sequence is broken after its first character
+    r'(?!ab)a*b',  # excluded characters aren't repeated    r'\w{2,}.(?<=_)',  # lookbehind hints at preceding characters
+    r'\w\w(?<=a\d)',
+    r'.y(?<![^c][^6])(?=f).',  # negative lookbehind hints at breaking it
 ])
-def test_explicitly_unsupported_cases(case):
-    """Explicitly unsupported cases should not fail with just generic error."""
-    node_type, regex = case
-    with pytest.raises(NotImplementedError) as e:
+def test_assertion_stats__hints(regex):
+    # assertions turned into hints are satisfied on the first attempt
+    unmatcher.assertion_stats.reset()
+    for _ in range(SMALL_TESTS_COUNT):
         unmatcher.reverse(regex)
-    assert (": " + node_type) not in str(e)
+    assert unmatcher.assertion_stats.failures == 0
+    assert unmatcher.assertion_stats.attempts == SMALL_TESTS_COUNT
+
+
+def test_reverse__no_assertions_not_compiled(monkeypatch):
+    def compile(*args, **kwargs):
+        raise AssertionError("pattern without assertions was compiled")
+    monkeypatch.setattr(re, 'compile', compile)
+    assert 'abc' == unmatcher.reverse('abc')
+
+
+@pytest.mark.parametrize('regex', [
+    r'abc',
+    r'(a|bc|d)+x',
+    r'[a-c0-9_\s]{2,4}',
+    r'(x)?((?(1)y|z))',
+    r'\d{3}-(?:\w|-)*?$',
+    r'(?=.*\d)\w{2,8}',
+])
+def test_cover(regex):
+    the_re = re.compile(regex)
+    coverage = unmatcher.cover(the_re)
+    assert len(coverage) > 0
+    for sample in coverage:
+        match = the_re.match(sample)
+        assert bool(match)
+        assert match.end() == len(sample)
+    assert coverage.samples == unmatcher.cover(the_re).samples
+
+
+def test_cover__branches():
+    coverage = unmatcher.cover(r'foo|bar|baz')
+    assert sorted(coverage.samples) == ['bar', 'baz', 'foo']
+    assert coverage.ratio == 1.0
+
+
+def test_cover__repeat_bounds():
+    coverage = unmatcher.cover(r'a{2,5}')
+    assert sorted(coverage.samples) == ['aa', 'aaa', 'aaaaa']
+    [repeat] = coverage.nodes
+    assert repeat.options == [2, 3, 5]
+    assert not repeat.uncovered
+
+
+@pytest.mark.parametrize('regex', [r'\d\d', r'\d{3}-\d{4}', r'\w+@\w+'])
+def test_cover__identical_class_escapes(regex):
+    # ``sre_parse`` shares one node object between all occurrences of ``\d``
+    coverage = unmatcher.cover(regex)
+    assert coverage.ratio == 1.0
+    assert all(node.covered for node in coverage.nodes)
+
+
+def test_cover__groupref_to_unmatched_group():
+    coverage = unmatcher.cover(r'(a)?\1')
+    assert coverage.samples == ['aa']
+    [repeat] = coverage.nodes
+    assert repeat.uncovered == [0]
+
+
+@pytest.mark.parametrize(('regex', 'samples'), [
+    (r'.(?<=_)', ['_']),
+    (r'(?=.*[x].).3', ['x3']),
+    (r'(?=SZ)[\d\w]{1,3}', ['SZ', 'SZ0']),  # only one of the options fails
+    (r'(?=SZ)[\d\w8]{1,3}', ['SZ']),  # options only fail in combination
+    (r'[X\d\S]{1,2}(?<=SZ)', ['SZ']),
+])
+def test_cover__assertions(regex, samples):
+    # the smallest characters don't match, so others are tried
+    assert samples == unmatcher.cover(regex).samples
+
+
+def test_cover__group_condition():
+    coverage = unmatcher.cover(r'(<)?\w(?(1)>|!)')
+    assert sorted(len(s) for s in coverage.samples) == [2, 3]
+    assert coverage.ratio == 1.0
+
+
+@pytest.mark.parametrize(('regex', 'shortest', 'longest'), [
+    (r'abc', 'abc', 'abc'),
+    (r'a{2,5}', 'aa', 'aaaaa'),
+    (r'(foo|ba[rz]){1,2}x', 'foox', 'foofoox'),
+    (r'\d{3}|[a-z]{2}', 'aa', '000'),
+    (r'(ab|c)\1{2,3}', 'ccc', 'abababab'),
+    (r'(a)?(?(1)bbbb|c)', 'c', 'abbbb'),
+    (r'(?=.*\d)(?=.*[A-Z])\w+', '0A', '0A' + '0' * 62),
+    # first attempts fail, so fallbacks are used
+    (r'^(?!000)\d{3}-\d{2}-\d{4}$', '100-00-0000', '100-00-0000'),
+    (r'^(?=.{8,16}$)(?=.*\d)[a-zA-Z0-9]+$', '00000000', '8' + 'm' * 15),
+    (r'(?!.)\)*', '', ''),
+    (r'[\.]|\s+S(?=[^c-n])', '.', '.'),
+    (r'(a)?\1', 'aa', 'aa'),
+    (r'(?:[T-U]|[l].)(?<=_)', 'l_', 'l_'),
+    (r'(?:h|[^3])[E-G](?<=6.)', '6F', '6F'),
+    (r'[\S]{1,2}(?<=Z)', 'Z', '!Z'),
+    (r'(?:(?:.|(\{))|[ ])(?=.)(?(1)\w)', '{2', '{2'),
+])
+def test_strategies(regex, shortest, longest):
+    assert shortest == unmatcher.reverse(regex, strategy='shortest')
+    assert longest == unmatcher.reverse(regex, strategy='longest')
+
+
+@pytest.mark.parametrize('strategy', ('shortest', 'longest'))
+def test_strategies__repeat_cap(strategy):
+    the_re = re.compile(r'(?:ab)*x')
+    reversed_re = unmatcher.reverse(the_re, strategy=strategy)
+    assert bool(the_re.match(reversed_re))
+    assert len(reversed_re) <= 2 * unmatcher.Reversal.MAX_REPEAT + 1
+
+
+def test_strategies__repeat_cap_changed(monkeypatch):
+    assert 64 == len(unmatcher.reverse('a*', strategy='longest'))
+    monkeypatch.setattr(unmatcher.Reversal, 'MAX_REPEAT', 3)
+    assert 'aaa' == unmatcher.reverse('a*', strategy='longest')
+
+
+def test_strategies__unhashable_group_value():
+    with pytest.raises(unmatcher.ReversalError):
+        unmatcher.reverse(r'(\w+)', ['a'], strategy='shortest')
+
+
+def test_strategies__group_values():
+    the_re = re.compile(r'(\w+)-\1')
+    assert 'a-a' == unmatcher.reverse(the_re, 'a', strategy='shortest')
+    assert 'b-b' == unmatcher.reverse(the_re, 'b', strategy='shortest')
+
+
+def test_invalid_strategy():
+    with pytest.raises(unmatcher.ReversalError):
+        unmatcher.reverse('foo', strategy='fastest')
+
+
+@pytest.mark.parametrize(('regex', 'prefix'), [
+    (r'foo', ''),
+    (r'/api/(v[12])/(users|orders)/\d+', '/api/v'),
+    (r'(a|ab)(c|bcd)(d*)', 'abcd'),
+    (r'\w*\w*x', 'hellox'),
+    (r'a{3,5}b', 'aaaa'),
+    (r'(x)?(?(1)y|z)', 'x'),
+    (r'[^a-z]\S*', 'Q'),
+    (r'(?=.*\d)\w{4,}', 'ab'),
+])
+def test_complete(regex, prefix):
+    the_re = re.compile(regex)
+    for _ in range(SMALL_TESTS_COUNT):
+        completed = unmatcher.complete(the_re, prefix)
+        assert completed.startswith(prefix)
+        match = the_re.match(completed)
+        assert bool(match)
+        assert match.end() == len(completed)
+
+
+@pytest.mark.randomize(ncalls=DEFAULT_TESTS_COUNT, **str_arg('prefix'))
+def test_complete__group(prefix):
+    if not prefix:
+        return
+    completed = unmatcher.complete(r'(\w+)@\1', prefix + '@')
+    assert completed == prefix + '@' + prefix
+
+
+@pytest.mark.parametrize(('regex', 'prefix'), [
+    (r'(?=.d)\w\w', 'a'),
+    (r'(?=.*\d)\w+', 'abc'),
+    (r'a(?!.*\d)\w{20}', 'ab'),
+    (r'(?=.*\d{5})\w{3,8}', 'abc'),  # prefix ends in the middle of repeat
+])
+def test_complete__assertions_in_prefix(regex, prefix):
+    # assertions that the prefix has passed still guide the completion
+    unmatcher.assertion_stats.reset()
+    for _ in range(SMALL_TESTS_COUNT):
+        unmatcher.complete(regex, prefix)
+    assert unmatcher.assertion_stats.failures == 0
+    assert unmatcher.assertion_stats.attempts == SMALL_TESTS_COUNT
+
+
+@pytest.mark.parametrize(('regex', 'prefix'), [
+    (r'(a\w{3})(?<=Z)b', 'a1'),
+    (r'(?:x|(a\w{3}))(?<=Z)b', 'a1'),
+])
+def test_complete__lookbehind_after_prefix(regex, prefix):
+    # lookbehinds guide the end of groups that the prefix ends in
+    unmatcher.assertion_stats.reset()
+    for _ in range(SMALL_TESTS_COUNT):
+        unmatcher.complete(regex, prefix)
+    assert unmatcher.assertion_stats.failures == 0
+    assert unmatcher.assertion_stats.attempts == SMALL_TESTS_COUNT
+
+
+@pytest.mark.parametrize(('regex', 'prefix', 'completed'), [
+    # '.' preferably matches the prefix, but only 'y' can be followed by 'f'
+    (r'.{0,1}y(?<![^c][^6])(?=f).', 'y', 'yf'),
+    (r'(?:a{3}|a\w)(?<=b)', 'a', 'ab'),
+    (r'(?=\w)(\w\w)\1', 'aba', 'abab'),
+])
+def test_complete__other_prefix_matches(regex, prefix, completed):
+    assert completed == unmatcher.complete(regex, prefix)
+
+
+@pytest.mark.parametrize(('regex', 'prefix'), [
+    (r'\w+-\d', 'a' * 10000),
+    (r'(ab)+c', 'ab' * 5000),
+    (r'(?:a|a)*b', 'a' * 10000),
+])
+def test_complete__long_prefix(regex, prefix):
+    completed = unmatcher.complete(regex, prefix)
+    assert completed.startswith(prefix)
+    assert re.match(r'(?:%s)$' % regex, completed)
+
+
+@pytest.mark.parametrize('flags', [0, re.LOCALE])
+def test_complete__bytes(flags):
+    the_re = re.compile(b'^\\d+[^\\s\\d](?=\\w)\\w.$', flags)
+    for _ in range(SMALL_TESTS_COUNT):
+        completed = unmatcher.complete(the_re, b'12')
+        assert completed.startswith(b'12')
+        match = the_re.match(completed)
+        assert bool(match)
+        assert match.end() == len(completed)
+
+
+def test_complete__group_repeat():
+    # capture group is matched again by every repetition
+    assert re.match(r'abb*$', unmatcher.complete(r'(a|b)+', 'ab'))
+
+
+@pytest.mark.parametrize(('regex', 'prefix'), [
+    (r'\d+', 'a'),
+    (r'abc', 'abcd'),
+    (r'a{3,5}b', 'aaaaaa'),
+    (r'(a)b\1', 'abb'),
+    # these would take exponential or quadratic time with backtracking
+    (r'(?:a|a)*b', 'a' * 1000 + 'c'),
+    (r'\w*\w*-', 'a' * 3000 + '!'),
+])
+def test_complete__invalid_prefix(regex, prefix):
+    with pytest.raises(unmatcher.ReversalError):
+        unmatcher.complete(regex, prefix)
+
+
+@pytest.mark.parametrize('regex', [
+    r'abc',
+    r'\d{3}-\d{4}',
+    r'[a-z]+@(gmail|yahoo)\.com',
+    r'(\w+)=\1',
+    r'(foo|bar){2,3}',
+    r'(x)?(?(1)y|z)',
+    r'a*',
+])
+def test_reverse_negative(regex):
+    the_re = re.compile(regex)
+    samples = unmatcher.reverse_negative(the_re, DEFAULT_TESTS_COUNT)
+    assert len(samples) == DEFAULT_TESTS_COUNT
+    for sample in samples:
+        match = the_re.match(sample.string)
+        assert not (match and match.end() == len(sample.string))
+        assert sample.mutation in ('charset', 'repeat_over',
+                                   'repeat_under', 'groupref')
+
+
+@pytest.mark.parametrize(('regex', 'mutation'), [
+    (r'[0-9]', 'charset'),
+    (r'(?:ab){3}', 'repeat_over'),
+    (r'(?:ab){3}', 'repeat_under'),
+    (r'(a)\1', 'groupref'),
+])
+def test_reverse_negative__mutations(regex, mutation):
+    samples = unmatcher.reverse_negative(regex, DEFAULT_TESTS_COUNT)
+    assert mutation in set(sample.mutation for sample in samples)
+
+
+def test_reverse_negative__identical_class_escapes():
+    # ``sre_parse`` shares one node object between all occurrences of ``\d``,
+    # so the mutated character must be found by sample's path
+    mutated_res = {
+        (0, 0): r'\d*\D\d*-\d{4}$',
+        (1,): r'\d{3}[^-]\d{4}$',
+        (2, 0): r'\d{3}-\d*\D\d*$',
+    }
+    the_re = re.compile(r'\d{3}-\d{4}')
+    for sample in unmatcher.reverse_negative(the_re, DEFAULT_TESTS_COUNT):
+        if sample.mutation == 'charset':
+            assert re.match(mutated_res[sample.path], sample.string)
+
+
+@pytest.mark.parametrize(('regex', 'path'), [(r'.*', (0, 0)), (r'a.b', (1,))])
+def test_reverse_negative__any(regex, path):
+    samples = unmatcher.reverse_negative(regex, DEFAULT_TESTS_COUNT)
+    assert any(sample.mutation == 'charset' and sample.path == path
+               for sample in samples)
+    for sample in samples:
+        if sample.path == path:
+            assert "\n" in sample.string
+
+
+def test_reverse_negative__unmutable():
+    with pytest.raises(unmatcher.ReversalError):
+        unmatcher.reverse_negative(re.compile('.*', re.DOTALL), 1)
+
+
+@pytest.mark.parametrize('regex', [r'a{1,3}?', r'(?:a|ab)b?'])
+def test_reverse_negative__partial_match(regex):
+    # ``match()`` stops at a shorter match for these, even if a full one exists
+    the_re = re.compile(regex)
+    for sample in unmatcher.reverse_negative(the_re, DEFAULT_TESTS_COUNT):
+        assert not re.match(r'(?:%s)$' % regex, sample.string)
+
+
+@pytest.mark.parametrize('regex', [r'(?:ab)*', r'(?:a.c){2,3}', r'(?:x|yz)+'])
+def test_repeat_noncapture_group(regex):
+    the_re = re.compile(regex)
+    for _ in range(SMALL_TESTS_COUNT):
+        reversed_re = unmatcher.reverse(the_re)
+        match = the_re.match(reversed_re)
+        assert bool(match)
+        assert match.end() == len(reversed_re)
+
+
+def test_groupref_to_unmatched_group():
+    with pytest.raises(unmatcher.ReversalError):
+        unmatcher.reverse(r'(a){0}\1')
+
+
+def test_reverse_negative__groupref_to_unmatched_group():
+    the_re = re.compile(r'(a)+\1')
+    for sample in unmatcher.reverse_negative(the_re, DEFAULT_TESTS_COUNT):
+        assert not re.match(r'(?:(a)+\1)$', sample.string)
+
+
+def test_empty_charset():
+    with pytest.raises(unmatcher.ReversalError):
+        unmatcher.reverse(r'[^\s\S]')
 
 
 # Utility functions
@@ -0,0 +1,84 @@
+"""
+Tests for the unmatcher_fuzz module.
+"""
+import random
+import re
+
+import unmatcher
+import unmatcher_fuzz
+
+import pytest
+
+
+SEEDS = range(64)
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_generated_pattern_compiles(seed):
+    generator = unmatcher_fuzz.RegexGenerator(random.Random(seed))
+    re.compile(unmatcher_fuzz.render(generator.generate()))
+
+
+def test_generated_assertions():
+    kinds = set()
+    for seed in SEEDS:
+        generator = unmatcher_fuzz.RegexGenerator(random.Random(seed))
+        pattern = unmatcher_fuzz.render(generator.generate())
+        kinds.update(re.findall(r'\(\?(<?[=!])', pattern))
+    assert kinds == set(['=', '!', '<=', '<!'])
+
+
+def test_generated_options():
+    flags, modes = 0, set()
+    for seed in SEEDS:
+        generator = unmatcher_fuzz.RegexGenerator(random.Random(seed))
+        seed_flags, as_bytes = generator.generate_options()
+        flags |= seed_flags
+        modes.add(as_bytes)
+    assert flags == re.IGNORECASE | re.DOTALL | re.MULTILINE
+    assert modes == set([False, True])
+
+
+@pytest.mark.parametrize('seed', SEEDS)
+def test_run_case(seed):
+    result = unmatcher_fuzz.run_case((seed, 4, 3))
+    assert result['seed'] == seed
+    assert result['failure'] is None, \
+        unmatcher_fuzz.format_failure(result['failure'])
+
+
+@pytest.mark.parametrize('function', ['complete', 'cover'])
+def test_check_pattern__wrong_result(monkeypatch, function):
+    # make the other function return valid strings, so they don't fail first
+    if function == 'complete':
+        monkeypatch.setattr(unmatcher, 'complete',
+                            lambda regex, prefix: prefix + '!')
+    else:
+        monkeypatch.setattr(unmatcher, 'cover',
+                            lambda regex: unmatcher.Coverage(['!'], []))
+    failure = unmatcher_fuzz.check_pattern('a+', 0, 1)
+    assert failure['function'].startswith(function)
+
+
+def test_shrink(monkeypatch):
+    # pretend that every pattern containing literal 'x' fails
+    def check_pattern(pattern, seed, samples, flags=0):
+        return {'function': 'reverse', 'string': ''} if 'x' in pattern \
+            else None
+    monkeypatch.setattr(unmatcher_fuzz, 'check_pattern', check_pattern)
+
+    tree = ('seq', [
+        ('literal', 'a'),
+        ('repeat', ('group', None, ('seq', [('any',), ('literal', 'x')])),
+         1, None, False),
+        ('set', False, [('char', 'b'), ('range', 'c', 'd')]),
+    ])
+    shrunk = unmatcher_fuzz.shrink(tree, 0, 1)
+    assert unmatcher_fuzz.render(shrunk) == 'x'
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_main(processes):
+    assert 0 == unmatcher_fuzz.main(['--patterns', '8', '--samples', '2',
+                                     '--processes', str(processes),
+                                     '--seed', '1'])
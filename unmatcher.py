@@ -6,6 +6,7 @@ __author__ = "Karol Kuczmarski"
 __license__ = "Simplified BSD"
 
 
+from collections import namedtuple
 import random
 import re
 import string
@@ -22,51 +23,138 @@ else:
     from itertools import imap
 
 
-__all__ = ['reverse', 'ReversalError']
+__all__ = ['reverse', 'reverse_negative', 'cover', 'complete',
+           'ReversalError', 'assertion_stats']
 
 
 def reverse(pattern, *args, **kwargs):
     """Reverse the regular expression, returning a string that would match it.
 
     :param pattern: Regular expression pattern, either compiled one or a string
+    :param strategy: How to generate the string (keyword-only):
+
+                     * ``'random'`` (default) -- a random matching string
+                     * ``'shortest'`` -- the shortest matching string
+                     * ``'longest'`` -- the longest matching string,
+                       with repetitions capped at ``Reversal.MAX_REPEAT``
+
+                     The ``'shortest'`` and ``'longest'`` strategies
+                     are deterministic, and their results are cached.
 
     Additional arguments (positional and keyword) will be used to supply
     predefined string matches for capture groups present in the ``pattern``.
+    Because of the ``strategy`` argument, a capture group named ``strategy``
+    can only be given its value positionally.
 
     :return: String that matches ``pattern``
     """
-    if is_string(pattern):
-        flags = None
-    else:
-        # assuming regex object
-        flags = pattern.flags
-        pattern = pattern.pattern
+    strategy = kwargs.pop('strategy', 'random')
+    try:
+        reversal_class = STRATEGIES[strategy]
+    except (KeyError, TypeError):
+        raise ReversalError(getattr(pattern, 'pattern', pattern),
+                            "invalid reversal strategy: %r" % (strategy,))
+    if strategy == 'random':
+        return perform_reversal(pattern, args, kwargs, reversal_class)
+
+    cache_key = (pattern, strategy, reversal_class.MAX_REPEAT,
+                 args, tuple(sorted(kwargs.items())))
+    try:
+        return _cache[cache_key]
+    except KeyError:
+        pass
+    except TypeError:  # unhashable capture group value
+        raise ReversalError(getattr(pattern, 'pattern', pattern),
+                            "invalid capture group values: %r" % (
+                                args + tuple(kwargs.values()),))
+
+    result = perform_reversal(pattern, args, kwargs, reversal_class)
+    if len(_cache) >= _MAXCACHE:
+        _cache.clear()
+    _cache[cache_key] = result
+    return result
+
+
+def reverse_negative(pattern, n, *args, **kwargs):
+    """Generate strings that are *not* matched by the regular expression,
+    but are only a small mutation away from strings which are.
+
+    Every string is created by reversing the expression while mutating
+    one of its elements:
+
+    * ``'charset'`` -- a character outside of the set matched by a literal,
+      character set, or ``.``
+    * ``'repeat_over'`` -- one repetition more than allowed
+    * ``'repeat_under'`` -- one repetition less than required
+    * ``'groupref'`` -- altered value of a backreference
 
-    sre_subpattern = re.sre_parse.parse(pattern)
+    :param pattern: Regular expression pattern, either compiled one or a string
+    :param n: Number of strings to generate
 
-    # use positional and keyword arguments, if any, to build the initial array
-    # of capture group values that will be used by the reverser
-    groupvals = kwargs or {}
-    for i, value in enumerate(args, 1):
-        if i in groupvals:
-            raise ReversalError(
-                pattern,
-                "reverse() got multiple values for capture group '%s'" % i)
-        groupvals[i] = value
+    Additional arguments (positional and keyword) will be used to supply
+    predefined string matches for capture groups present in the ``pattern``.
+
+    :return: List of :class:`NegativeSample` tuples, whose ``string``
+             is guaranteed not to match ``pattern`` in its entirety
+    """
+    pattern, reversal = create_reversal('reverse_negative',
+                                        pattern, args, kwargs,
+                                        reversal_class=NegativeReversal)
     try:
-        groups = resolve_groupvals(sre_subpattern.pattern, groupvals)
+        return [reversal.perform() for _ in xrange(n)]
     except ValueError as e:
         raise ReversalError(pattern, str(e))
 
-    # perform the reversal using the expression's AST and capture group values
-    reversal = Reversal(sre_subpattern.data, flags=flags, groups=groups,
-                        string_class=type(pattern))
+
+def cover(pattern, *args, **kwargs):
+    """Generate a small, deterministic set of strings matching the regular
+    expression, which together exercise every alternative of its branches
+    and conditional groups, boundary counts (min, min+1 and max)
+    of its repetitions, and every item of its character sets.
+
+    :param pattern: Regular expression pattern, either compiled one or a string
+
+    Additional arguments (positional and keyword) will be used to supply
+    predefined string matches for capture groups present in the ``pattern``.
+
+    Only strings that actually match are kept, so options that cannot be
+    reconciled with lookahead/lookbehind assertions or backreferences
+    (e.g. skipping the group in ``(a)?\\1``) may remain uncovered.
+
+    :return: :class:`Coverage` object with the generated ``samples``
+             and per-node coverage report
+    """
+    pattern, reversal = create_reversal('cover', pattern, args, kwargs,
+                                        reversal_class=CoverageReversal)
     try:
         return reversal.perform()
     except ValueError as e:
         raise ReversalError(pattern, str(e))
 
 
+def complete(pattern, prefix, *args, **kwargs):
+    """Complete given prefix into a string that matches the regular expression.
+
+    :param pattern: Regular expression pattern, either compiled one or a string
+    :param prefix: String that the result should start with
+
+    Additional arguments (positional and keyword) will be used to supply
+    predefined string matches for capture groups present in the ``pattern``.
+    Capture groups that are matched (even partially) by the ``prefix``
+    are assigned values consistent with it.
+
+    :return: String that starts with ``prefix`` and matches ``pattern``
+    :raise ReversalError: When no string starting with ``prefix``
+                          can match the ``pattern``
+    """
+    pattern, reversal = create_reversal('complete', pattern, args, kwargs,
+                                        reversal_class=CompletionReversal)
+    try:
+        return reversal.complete(prefix)
+    except ValueError as e:
+        raise ReversalError(pattern, str(e))
+
+
 class ReversalError(ValueError):
     """Exception raised when an error has occurred
     while reversing a regular expression.
@@ -79,10 +167,184 @@ class ReversalError(ValueError):
         super(ReversalError, self).__init__(message)
 
 
+class AssertionStats(object):
+    """Statistics of reversals that had to satisfy lookahead/lookbehind
+    assertions by generating candidate strings and checking them
+    against the compiled regular expression.
+    """
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """Clear all the counters."""
+        self.reversals = 0
+        self.attempts = 0
+        self.failures = 0
+
+    def record(self, attempts, success):
+        """Record the outcome of a single reversal.
+
+        :param attempts: Number of candidate strings that were generated
+        :param success: Whether a matching candidate was eventually found
+        """
+        self.reversals += 1
+        self.attempts += attempts
+        if not success:
+            self.failures += 1
+
+    @property
+    def success_rate(self):
+        """Fraction of candidate strings that turned out to match."""
+        if not self.attempts:
+            return None
+        return float(self.reversals - self.failures) / self.attempts
+
+    def __repr__(self):
+        return "<%s reversals=%d attempts=%d failures=%d>" % (
+            self.__class__.__name__,
+            self.reversals, self.attempts, self.failures)
+
+
+#: Global statistics of reversals involving assertions
+assertion_stats = AssertionStats()
+
+
+#: String not matching a regular expression, generated by
+#: :func:`reverse_negative`, together with the name of ``mutation``
+#: that was applied and ``path`` of indices leading to the mutated node
+#: in regex AST
+NegativeSample = namedtuple('NegativeSample', ['string', 'mutation', 'path'])
+
+
+class Coverage(object):
+    """Result of :func:`cover`: strings matching a regular expression
+    together with the report of which of its elements they exercise.
+    """
+    def __init__(self, samples, nodes):
+        """Constructor.
+
+        :param samples: List of generated strings
+        :param nodes: List of :class:`NodeCoverage` objects
+        """
+        self.samples = samples
+        self.nodes = nodes
+
+    @property
+    def ratio(self):
+        """Fraction of all options of all nodes that has been covered."""
+        total = sum(len(node.options) for node in self.nodes)
+        if not total:
+            return 1.0
+        return float(sum(len(node.covered) for node in self.nodes)) / total
+
+    def __iter__(self):
+        return iter(self.samples)
+
+    def __len__(self):
+        return len(self.samples)
+
+    def __repr__(self):
+        return "<%s samples=%d ratio=%.2f>" % (
+            self.__class__.__name__, len(self.samples), self.ratio)
+
+
+class NodeCoverage(object):
+    """Coverage of a single node from regular expression AST."""
+
+    def __init__(self, path, type_, options):
+        """Constructor.
+
+        :param path: Tuple of indices leading to the node in regex AST
+        :param type_: Name of the node's type, e.g. ``'branch'``
+        :param options: List of node's options that should be covered:
+                        branch variant indices, repeat counts, charset item
+                        indices, or ``'yes'``/``'no'`` for conditional groups
+        """
+        self.path = path
+        self.type = type_
+        self.options = options
+        self.covered = set()
+
+    @property
+    def uncovered(self):
+        return [opt for opt in self.options if opt not in self.covered]
+
+    def __repr__(self):
+        return "<%s %s at %s: %d/%d>" % (
+            self.__class__.__name__, self.type,
+            '.'.join(imap(str, self.path)),
+            len(self.covered), len(self.options))
+
+
 # Implementation
 
 is_string = lambda x: isinstance(x, (str if IS_PY3 else basestring))
 
+_cache = {}
+_MAXCACHE = 512
+
+
+def perform_reversal(pattern, args, kwargs, reversal_class):
+    """Reverse the regular expression for :func:`reverse`
+    using given :class:`Reversal` class.
+    """
+    pattern, reversal = create_reversal('reverse', pattern, args, kwargs,
+                                        reversal_class=reversal_class)
+    try:
+        return reversal.perform()
+    except ValueError as e:
+        raise ReversalError(pattern, str(e))
+
+
+def create_reversal(func_name, pattern, args, kwargs, reversal_class=None):
+    """Prepare the reversal of a regular expression.
+
+    :param func_name: Name of the public function that was called,
+                      used in error messages
+    :param pattern: Regular expression pattern, either compiled one or a string
+    :param args: Positional values for capture groups
+    :param kwargs: Keyword values for capture groups
+    :param reversal_class: :class:`Reversal` class to use
+
+    :return: Tuple of pattern string and the :class:`Reversal` object
+    """
+    if is_string(pattern):
+        flags = None
+        regex = None
+    else:
+        # assuming regex object
+        flags = pattern.flags
+        regex = pattern
+        pattern = pattern.pattern
+
+    sre_subpattern = re.sre_parse.parse(pattern)
+
+    # use positional and keyword arguments, if any, to build the initial array
+    # of capture group values that will be used by the reverser
+    groupvals = kwargs or {}
+    for i, value in enumerate(args, 1):
+        if i in groupvals:
+            raise ReversalError(
+                pattern,
+                "%s() got multiple values for capture group '%s'" % (
+                    func_name, i))
+        groupvals[i] = value
+    try:
+        groups = resolve_groupvals(sre_subpattern.pattern, groupvals)
+    except ValueError as e:
+        raise ReversalError(pattern, str(e))
+
+    # the reversal uses the expression's AST and capture group values
+    reversal_class = reversal_class or Reversal
+    reversal = reversal_class(sre_subpattern.data, flags=flags, groups=groups,
+                              string_class=type(pattern), regex=regex)
+
+    # compiled regex is only needed to verify the results,
+    # so don't compile the pattern unless they will be verified
+    if regex is None and (reversal.ALWAYS_VERIFY or reversal.has_assertions):
+        reversal.regex = re.compile(pattern)
+    return pattern, reversal
+
 
 def resolve_groupvals(sre_pattern, groupvals):
     """Resolve a dictionary of capture group values (mapped from either
@@ -117,32 +379,93 @@ class Reversal(object):
         'space': string.whitespace,
     }
     MAX_REPEAT = 64
+    MAX_ASSERTION_ATTEMPTS = 128
+    #: Whether the results are always verified against the compiled regex,
+    #: rather than only for expressions with lookahead/lookbehind assertions
+    ALWAYS_VERIFY = False
 
-    def __init__(self, regex_ast, flags=None, groups=None, string_class=None):
+    def __init__(self, regex_ast, flags=None, groups=None, string_class=None,
+                 regex=None):
         """Constructor.
 
         Use keywords to pass arguments other than ``regex_ast``.
+
+        :param regex: Compiled regular expression corresponding to
+                      ``regex_ast``, used to verify the results if
+                      the expression contains lookahead/lookbehind assertions
         """
         self.regex_ast = regex_ast
         self.flags = flags or 0
+        # ``re`` flags are enums since Python 3.6, which makes combining
+        # them for every character set noticeably slow
+        self._ignorecase = bool(self.flags & re.IGNORECASE)
         self.groups = groups or [None]
+        self.regex = regex
+
+        # without assertions, there are no lookahead requirements to track
+        # and the results don't need to be verified
+        self.has_assertions = has_assertions(regex_ast)
+        self.attempts = 0
+        self._reset_constraints()
+        self._charsets = {}
+        self._in_charsets = {}
 
         # use correct string class depending on Python version or argument
         if string_class is None:
             string_class = str if IS_PY3 else unicode
         self._str = string_class
-        self._chr = unichr if string_class.__name__ == 'unicode' else chr
+        if string_class.__name__ == 'unicode':
+            self._chr = unichr
+        elif IS_PY3 and string_class is bytes:
+            self._chr = lambda code: bytes([code])
+        else:
+            self._chr = chr
 
     def perform(self):
-        return self._reverse_nodes(self.regex_ast)
+        if not self.has_assertions:
+            return self._reverse_nodes(self.regex_ast)
+        if self.regex is None:
+            raise ValueError(
+                "compiled regex is required to reverse assertions")
+
+        # assertions are only used as hints when generating the string,
+        # so every candidate has to be verified against the actual regex
+        initial_groups = list(self.groups)
+        self.attempts = 0
+        while self.attempts < self.MAX_ASSERTION_ATTEMPTS:
+            self.attempts += 1
+            self.groups = list(initial_groups)
+            self._reset_constraints()
+            result = self._reverse_nodes(self.regex_ast)
+            if fullmatch(self.regex, result):
+                assertion_stats.record(self.attempts, True)
+                return result
+
+        assertion_stats.record(self.attempts, False)
+        raise ValueError(
+            "could not satisfy lookahead/lookbehind assertions "
+            "in %d attempts" % self.attempts)
 
     # Reversing regex AST nodes
 
-    def _reverse_nodes(self, nodes):
+    def _reverse_nodes(self, nodes, index=None):
         """Generates string matching given sequence of nodes
         from regular expressions' abstract syntax tree (AST).
+
+        :param index: Index of the branch variant or conditional group's arm
+                      that ``nodes`` are, if they are one
         """
-        return self._str().join(imap(self._reverse_node, nodes))
+        hints = self._lookbehind_hints(nodes) if self.has_assertions else None
+        if hints is None:
+            return self._str().join(imap(self._reverse_node, nodes))
+        return self._str().join([self._reverse_hinted_node(node, i, hints)
+                                 for i, node in enumerate(nodes)])
+
+    def _reverse_repeated_nodes(self, nodes, count):
+        """Generates string matching given sequence of nodes
+        repeated ``count`` times.
+        """
+        return self._reverse_nodes(list(nodes) * count)
 
     def _reverse_node(self, node):
         """Generates string matching given node from regular expression AST."""
@@ -153,7 +476,7 @@ class Reversal(object):
         if type_ == re.sre_parse.NOT_LITERAL:
             return self._reverse_not_literal_node(data)
         if type_ == re.sre_parse.ANY:
-            return random.choice(self._charset('any'))
+            return self._choose_char(self._charset('any'))
 
         if type_ == re.sre_parse.IN:
             return self._reverse_in_node(data)
@@ -170,15 +493,14 @@ class Reversal(object):
         if type_ == re.sre_parse.GROUPREF_EXISTS:
             return self._reverse_groupref_exists_node(data)
 
-        if type_ in (re.sre_parse.ASSERT, re.sre_parse.ASSERT_NOT):
-            # TODO: see whether these are in any way relevant
-            # to string generation and support them if so
-            raise NotImplementedError(
-                "lookahead/behind assertion are not supported")
+        if type_ == re.sre_parse.ASSERT:
+            return self._reverse_assert_node(data)
+        if type_ == re.sre_parse.ASSERT_NOT:
+            return self._reverse_assert_not_node(data)
         if type_ == re.sre_parse.AT:
             # match-beginning (^) or match-end ($);
             # irrelevant for string generation
-            return ''
+            return self._str()
 
         raise NotImplementedError(
             "unsupported regular expression element: %s" % type_)
@@ -194,6 +516,8 @@ class Reversal(object):
         if self.flags & re.IGNORECASE:
             case_func = random.choice((self._str.lower, self._str.upper))
             char = case_func(char)
+        if self.has_assertions:
+            self._consume_constraints(char)
         return char
 
     def _reverse_not_literal_node(self, node_data):
@@ -204,9 +528,9 @@ class Reversal(object):
         to ``[^X]`` syntax, where ``X`` is a character.
         """
         excluded = self._chr(node_data)
-        if self.flags & re.IGNORECASE:
-            excluded = (excluded.lower(), excluded.upper())
-        return random.choice(self._negate(excluded))
+        excluded = (excluded.lower(), excluded.upper()) \
+            if self.flags & re.IGNORECASE else (excluded,)
+        return self._choose_char(self._negate(excluded))
 
     def _reverse_in_node(self, node_data):
         """Generates string matching the ``sre_parse.IN`` node
@@ -217,30 +541,13 @@ class Reversal(object):
         from simple uses of ``|`` operator, where all branches match
         just one, literal character (e.g. ``a|b|c``).
         """
-        negate = str(node_data[0][0]).lower() == 'negate'
-        if negate:
-            node_data = node_data[1:]
-
-        charset = set()
-        for type_, data in node_data:
-            if type_ == re.sre_parse.LITERAL:
-                charset.add(self._chr(data))
-            elif type_ == re.sre_parse.RANGE:
-                min_char, max_char = data
-                charset.update(imap(self._chr, xrange(min_char, max_char + 1)))
-            elif type_ == re.sre_parse.CATEGORY:
-                data = str(data).lower()  # for Python 3.5+
-                _, what = data.rsplit('_', 1)  # category(_not)?_(digit|etc.)
-                category_chars = self._charset(what)
-                if '_not_' in data:
-                    category_chars = self._negate(category_chars)
-                charset.update(category_chars)
-            else:
-                raise ValueError("invalid charset alternative: %s" % type_)
-
-        if negate:
-            charset = self._negate(charset)
-        return random.choice(list(charset))
+        # the node matches the same characters every time it's reversed;
+        # keeping it in the cache ensures that its ``id()`` isn't reused
+        cached = self._in_charsets.get(id(node_data))
+        if cached is None or cached[0] is not node_data:
+            cached = self._in_charsets[id(node_data)] = \
+                (node_data, list(self._in_charset(node_data)))
+        return self._choose_char(cached[1])
 
     def _reverse_repeat_node(self, node_data):
         """Generates string matching ``sre_parse.MIN_REPEAT``
@@ -248,13 +555,23 @@ class Reversal(object):
 
         This node matches a repetition of pattern matched by its child node.
         """
-        # ``[what]`` is always a 1-element list due to quirk in ``sre_parse``;
-        # for reference, see `sre_parse.py` (lines 503-514) in Python's stdlib
-        min_count, max_count, [what] = node_data
+        # ``what`` is usually a 1-element list, but since Python 3.7
+        # ``sre_parse`` inlines the contents of non-capture groups into it
+        min_count, max_count, what = node_data
 
         max_count = min(max_count, self.MAX_REPEAT)
+
+        if self.has_assertions:
+            # don't repeat characters that preceding lookaheads exclude
+            if len(what) == 1 and self._excluded_sequences:
+                charset = self._node_charset(what[0])
+                if charset and charset <= self._next_excluded():
+                    max_count = min_count
+            # make room for characters required by preceding lookaheads
+            min_count = max(min_count, min(self._required_count(), max_count))
+
         count = random.randint(min_count, max_count)
-        return self._reverse_nodes([what] * count)
+        return self._reverse_repeated_nodes(what, count)
 
     def _reverse_branch_node(self, node_data):
         """Generates string matching the ``sre_parse.BRANCH`` node
@@ -268,8 +585,8 @@ class Reversal(object):
         # for reference, see `sre_parse.py` (line 357) in Python's stdlib
         _, variants = node_data
 
-        nodes = random.choice(variants)
-        return self._reverse_nodes(nodes)
+        index = random.randrange(len(variants))
+        return self._reverse_nodes(variants[index], index)
 
     def _reverse_subpattern_node(self, node_data):
         """Generates string matching the ``sre_parse.SUBPATTERN`` node
@@ -302,6 +619,9 @@ class Reversal(object):
         # and detects circular/forward references at parse time,
         # so handling of this node can be indeed very simple
         index = node_data
+        if self.groups[index] is None:
+            raise ValueError(
+                "reference to capture group %s that didn't match" % index)
         return self.groups[index]
 
     def _reverse_groupref_exists_node(self, node_data):
@@ -315,31 +635,1425 @@ class Reversal(object):
         index, yes_pattern, no_pattern = node_data
 
         if self.groups[index] is not None:
-            return self._reverse_nodes(yes_pattern)
+            return self._reverse_nodes(yes_pattern, 0)
         else:
-            return self._reverse_nodes(no_pattern) if no_pattern else ""
+            return self._reverse_nodes(no_pattern, 1) \
+                if no_pattern else self._str()
+
+    def _reverse_assert_node(self, node_data):
+        """Generates string matching the ``sre_parse.ASSERT`` node
+        in regexp. AST.
+
+        This node is a lookahead or lookbehind assertion, which doesn't
+        consume any characters by itself. Single-character nodes at the start
+        of a lookahead are turned into charsets for the next characters,
+        while lookaheads of the form ``(?=.*X)``, where ``X`` is a sequence
+        of single-character nodes, become a requirement that the following
+        characters contain a sequence matching ``X``.
+        Lookbehinds are turned into similar hints by :meth:`_reverse_nodes`
+        before the preceding nodes are reversed.
+        Everything else is only checked after the whole string is generated.
+        """
+        direction, nodes = node_data
+        if direction < 0:
+            return self._str()
+        nodes = list(nodes)
+
+        self._require_next(self._lookahead_prefix(nodes))
+        charsets = self._lookahead_sequence(nodes)
+        if charsets:
+            self._required_charsets.append(charsets)
+        return self._str()
+
+    def _reverse_assert_not_node(self, node_data):
+        """Generates string matching the ``sre_parse.ASSERT_NOT`` node
+        in regexp. AST.
+
+        This node is a negative lookahead or lookbehind assertion.
+        Lookaheads of the form ``(?!X)``, where ``X`` is a sequence
+        of single-character nodes, make the next characters avoid
+        continuing that sequence, while those of the form ``(?!.*X)``,
+        where ``X`` matches a single character, exclude its charset
+        from the rest of the string. Lookbehinds are turned into similar
+        hints by :meth:`_reverse_nodes` before the preceding nodes
+        are reversed.
+        Everything else is only checked after the whole string is generated.
+        """
+        direction, nodes = node_data
+        if direction < 0:
+            return self._str()
+        nodes = list(nodes)
+
+        charsets = [self._node_charset(node) for node in nodes]
+        if charsets and None not in charsets:
+            self._excluded_sequences.append(charsets)
+
+        charset = self._lookahead_charset(nodes)
+        if charset:
+            self._excluded_chars |= charset
+        return self._str()
 
     # Handling character sets
 
+    def _node_charset(self, node):
+        """Return set of chars matched by given single-character node
+        from regex AST, or ``None`` if it's not such a node.
+        """
+        type_, data = node
+        if type_ == re.sre_parse.LITERAL:
+            char = self._chr(data)
+            if self.flags & re.IGNORECASE:
+                return set([char.lower(), char.upper()])
+            return set([char])
+        if type_ == re.sre_parse.NOT_LITERAL:
+            char = self._chr(data)
+            excluded = (char.lower(), char.upper()) \
+                if self.flags & re.IGNORECASE else (char,)
+            return set(self._negate(excluded))
+        if type_ == re.sre_parse.ANY:
+            return set(self._charset('any'))
+        if type_ == re.sre_parse.IN:
+            return self._in_charset(data)
+        return None
+
+    def _in_charset(self, node_data):
+        """Return set of chars matched by the ``sre_parse.IN`` node."""
+        negate = str(node_data[0][0]).lower() == 'negate'
+        if negate:
+            node_data = node_data[1:]
+
+        charset = set()
+        for type_, data in node_data:
+            if type_ == re.sre_parse.LITERAL:
+                charset.add(self._chr(data))
+            elif type_ == re.sre_parse.RANGE:
+                min_char, max_char = data
+                charset.update(imap(self._chr, xrange(min_char, max_char + 1)))
+            elif type_ == re.sre_parse.CATEGORY:
+                data = str(data).lower()  # for Python 3.5+
+                _, what = data.rsplit('_', 1)  # category(_not)?_(digit|etc.)
+                category_chars = self._charset(what)
+                if '_not_' in data:
+                    category_chars = self._negate(category_chars)
+                charset.update(category_chars)
+            else:
+                raise ValueError("invalid charset alternative: %s" % type_)
+
+        if self._ignorecase:
+            charset.update([char.lower() for char in charset] +
+                           [char.upper() for char in charset])
+        if negate:
+            charset = set(self._negate(charset))
+        return charset
+
+    def _lookahead_prefix(self, nodes):
+        """Return list of charsets that the characters immediately following
+        the lookahead with given nodes must belong to, in order.
+
+        Bounded repetitions of varying length are assumed to repeat
+        the minimum number of times, so that e.g. ``(?=.?a)``
+        hints at ``a`` being the next character.
+        """
+        charsets = []
+        for type_, data in nodes:
+            if type_ in (re.sre_parse.MIN_REPEAT, re.sre_parse.MAX_REPEAT):
+                min_count, max_count, what = data
+                if len(what) != 1:
+                    break
+                charset = self._node_charset(what[0])
+                if charset is None:
+                    break
+                charsets.extend([charset] * min_count)
+                if max_count == re.sre_parse.MAXREPEAT:
+                    break  # positions of following nodes are anyone's guess
+                continue
+
+            charset = self._node_charset((type_, data))
+            if charset is None:
+                break
+            charsets.append(charset)
+        return charsets
+
+    def _lookbehind_hints(self, nodes):
+        """Find lookbehinds of single-character nodes in given sequence
+        of nodes, and turn them into charsets for the characters
+        of nodes immediately preceding them.
+
+        Charsets for the last characters of the sequence itself,
+        set by the enclosing sequence in ``self._trailing_charsets``,
+        are treated like a lookbehind at its end. Negative lookbehinds
+        are only used if all of their characters come from single-character
+        nodes of the sequence.
+
+        :return: Tuple of two dictionaries: one mapping indices
+                 of single-character nodes to lists of (negate, charsets)
+                 pairs for the characters starting at them, and one mapping
+                 indices of groups, branches and repeats to charsets
+                 for their last characters; or ``None`` if there are no hints
+        """
+        lookbehinds = [(i, type_ == re.sre_parse.ASSERT_NOT,
+                        [self._node_charset(node) for node in data[1]])
+                       for i, (type_, data) in enumerate(nodes)
+                       if type_ in (re.sre_parse.ASSERT,
+                                    re.sre_parse.ASSERT_NOT) and data[0] < 0]
+        trailing, self._trailing_charsets = self._trailing_charsets, None
+        if trailing:
+            lookbehinds.append((len(nodes), False, trailing))
+        if not lookbehinds:
+            return None
+
+        next_hints, last_hints = {}, {}
+        for i, negate, charsets in lookbehinds:
+            if None in charsets:
+                continue
+            start = i
+            while start > 0 and i - start < len(charsets) and \
+                    self._node_charset(nodes[start - 1]) is not None:
+                start -= 1
+            rest = len(charsets) - (i - start)
+            if negate:
+                if start < i and not rest:
+                    next_hints.setdefault(start, []).append((True, charsets))
+                continue
+            if start < i:
+                next_hints.setdefault(start, []).append(
+                    (False, charsets[rest:]))
+            if rest and start > 0 and nodes[start - 1][0] in (
+                    re.sre_parse.SUBPATTERN, re.sre_parse.BRANCH,
+                    re.sre_parse.MIN_REPEAT, re.sre_parse.MAX_REPEAT):
+                last_hints[start - 1] = charsets[:rest]
+        return next_hints, last_hints
+
+    def _reverse_hinted_node(self, node, i, hints):
+        """Generates string matching ``i``-th node of a sequence,
+        applying hints from :meth:`_lookbehind_hints` to it first.
+        """
+        next_hints, last_hints = hints
+        for negate, charsets in next_hints.get(i, ()):
+            if negate:
+                self._excluded_sequences.append(charsets)
+            else:
+                self._require_next(charsets)
+        self._trailing_charsets = last_hints.get(i)
+        try:
+            return self._reverse_node(node)
+        finally:
+            self._trailing_charsets = None
+
+    def _lookahead_sequence(self, nodes):
+        """Return list of charsets for a sequence of characters
+        which must appear somewhere for the lookahead with given nodes
+        to succeed, or ``None`` if the lookahead doesn't have such simple form.
+        """
+        if not nodes:
+            return None
+        repeat_type, repeat_data = nodes[0]
+        if repeat_type not in (re.sre_parse.MIN_REPEAT,
+                               re.sre_parse.MAX_REPEAT):
+            return None
+        if repeat_data[0] != 0:
+            return None
+        return self._lookahead_prefix(nodes[1:]) or None
+
+    def _lookahead_charset(self, nodes):
+        """Return set of chars of which at least one must appear
+        for the lookahead with given nodes to succeed,
+        or ``None`` if the lookahead doesn't have such simple form.
+        """
+        if len(nodes) != 2:
+            return None
+        repeat_type, repeat_data = nodes[0]
+        if repeat_type not in (re.sre_parse.MIN_REPEAT,
+                               re.sre_parse.MAX_REPEAT):
+            return None
+        if repeat_data[0] != 0:
+            return None
+        return self._node_charset(nodes[1])
+
+    def _choose_char(self, charset):
+        """Pick a random character from given charset,
+        preferring those which satisfy pending lookahead requirements.
+        """
+        if not charset:
+            raise ValueError("character set doesn't match any character")
+        if not self.has_assertions:
+            return self._pick(charset)
+
+        if self._excluded_chars or self._excluded_sequences:
+            excluded = self._next_excluded()
+            candidates = [c for c in charset if c not in excluded]
+            if candidates:
+                charset = candidates
+        if self._next_charsets:
+            candidates = [c for c in charset if c in self._next_charsets[0]]
+            if candidates:
+                charset = candidates
+
+        for required in self._required_charsets:
+            candidates = [c for c in charset if c in required[0]]
+            if candidates:
+                char = self._pick(candidates)
+                break
+        else:
+            char = self._pick(charset)
+
+        self._consume_constraints(char)
+        return char
+
+    def _pick(self, seq):
+        """Pick one of the elements of non-empty sequence."""
+        return random.choice(seq)
+
+    def _next_excluded(self):
+        """Return set of chars which the next character should avoid
+        to satisfy pending negative lookaheads.
+        """
+        return self._excluded_chars.union(
+            *[excluded[0] for excluded in self._excluded_sequences])
+
+    def _required_count(self):
+        """Return number of characters needed to satisfy
+        pending lookahead requirements.
+        """
+        return max(len(self._next_charsets),
+                   sum(imap(len, self._required_charsets)))
+
+    def _reset_constraints(self):
+        """Clear lookahead requirements before generating a new string."""
+        self._next_charsets = []
+        self._required_charsets = []
+        self._excluded_chars = set()
+        self._excluded_sequences = []
+        self._trailing_charsets = None
+
+    def _consume_constraints(self, char):
+        """Update lookahead requirements after given character
+        has been generated.
+        """
+        if self._next_charsets:
+            self._next_charsets.pop(0)
+        if self._excluded_sequences:
+            # sequences continued by the character have to be broken
+            # by one of the following ones instead
+            self._excluded_sequences = [
+                excluded[1:] for excluded in self._excluded_sequences
+                if len(excluded) > 1 and char in excluded[0]]
+        if self._required_charsets:
+            pending = []
+            for required in self._required_charsets:
+                if char in required[0]:
+                    # rest of the sequence has to follow right away
+                    self._require_next(required[1:])
+                else:
+                    pending.append(required)
+            self._required_charsets = pending
+
+    def _require_next(self, charsets):
+        """Require the next characters to belong to given charsets, in order.
+        """
+        for i, charset in enumerate(charsets):
+            if i < len(self._next_charsets):
+                self._next_charsets[i] = self._next_charsets[i] & charset
+            else:
+                self._next_charsets.append(charset)
+
     def _charset(self, name, flags=None):
         """Return chars belonging to charset of given name.
         :param flags: Optional flags override
         """
         # FIXME: take re.LOCALE and re.UNICODE flags into account
         flags = self.flags if flags is None else flags
+        key = (name, flags)
+        if key in self._charsets:
+            return self._charsets[key]
 
         if name == 'any':
             all_chars = string.printable
             if not (flags & re.DOTALL):
                 all_chars = all_chars.replace("\n", "")
-            return all_chars
+        elif name in self.BUILTIN_CHARSETS:
+            all_chars = self.BUILTIN_CHARSETS[name]
+        else:
+            raise ValueError("invalid charset name '%s'" % name)
 
-        if name in self.BUILTIN_CHARSETS:
-            return self.BUILTIN_CHARSETS[name]
+        charset = self._charsets[key] = self._chars(all_chars)
+        return charset
 
-        raise ValueError("invalid charset name '%s'" % name)
+    def _chars(self, ascii_chars):
+        """Convert string of ASCII characters into a sequence
+        of characters of the reversal's string class.
+        """
+        if IS_PY3 and self._str is bytes:
+            return [self._chr(ord(c)) for c in ascii_chars]
+        return ascii_chars
 
     def _negate(self, charset):
         """Returns negated version of given charset."""
         all_chars = self._charset('any')
         return list(set(all_chars) - set(charset))
+
+
+class PathTrackingMixin(object):
+    """Mixin for reversals which need to tell apart the regex AST nodes
+    they reverse, as ``sre_parse`` shares the same node object
+    between e.g. all occurrences of ``\\d``.
+
+    While every node is being reversed, ``self._path`` holds the tuple
+    of indices leading to it in regex AST, as in :func:`walk_nodes`.
+    """
+    _path = ()
+
+    def _reverse_nodes(self, nodes, index=None):
+        parent_path = self._path
+        path = parent_path if index is None else parent_path + (index,)
+
+        hints = self._lookbehind_hints(nodes) if self.has_assertions else None
+        result = []
+        try:
+            for i, node in enumerate(nodes):
+                self._path = path + (i,)
+                result.append(self._reverse_node(node) if hints is None
+                              else self._reverse_hinted_node(node, i, hints))
+        finally:
+            self._path = parent_path
+        return self._str().join(result)
+
+    def _reverse_repeated_nodes(self, nodes, count):
+        # every repetition consists of the same nodes, with the same paths;
+        # hints for the last characters apply to the last repetitions,
+        # or only to the very last one if their length may vary
+        trailing, self._trailing_charsets = self._trailing_charsets, None
+        width = None
+        if trailing and None not in [self._node_charset(node)
+                                     for node in nodes]:
+            width = len(nodes)
+
+        result = []
+        for i in xrange(count):
+            if width:
+                end = len(trailing) - (count - 1 - i) * width
+                if end > 0:
+                    self._trailing_charsets = trailing[max(0, end - width):end]
+            elif i == count - 1:
+                self._trailing_charsets = trailing
+            result.append(self._reverse_nodes(nodes))
+        return self._str().join(result)
+
+
+def has_assertions(nodes):
+    """Check whether given regex AST nodes contain any lookahead
+    or lookbehind assertions.
+    """
+    for type_, data in nodes:
+        if type_ in (re.sre_parse.ASSERT, re.sre_parse.ASSERT_NOT):
+            return True
+        if type_ in (re.sre_parse.MIN_REPEAT, re.sre_parse.MAX_REPEAT):
+            if has_assertions(data[-1]):
+                return True
+        elif type_ == re.sre_parse.BRANCH:
+            if any(imap(has_assertions, data[1])):
+                return True
+        elif type_ == re.sre_parse.SUBPATTERN:
+            if has_assertions(data[-1]):
+                return True
+        elif type_ == re.sre_parse.GROUPREF_EXISTS:
+            if any(has_assertions(p) for p in data[1:] if p):
+                return True
+    return False
+
+
+def fullmatch(regex, string):
+    """Check whether compiled ``regex`` matches the whole ``string``."""
+    if hasattr(regex, 'fullmatch'):  # Python 3.4+
+        return regex.fullmatch(string) is not None
+    return re.match(r'(?:%s)\Z' % regex.pattern, string, regex.flags) \
+        is not None
+
+
+class DeterministicReversal(Reversal):
+    """Base class for reversals which always generate the same string
+    for given regular expression.
+
+    Characters are picked as the smallest ones from their charsets,
+    and literals are used without changing their case.
+
+    If the string doesn't satisfy assertions, or cannot be generated at all
+    (e.g. because of a reference to a group that was skipped), it is
+    generated again, up to ``MAX_ASSERTION_ATTEMPTS`` times. Every attempt
+    picks the next characters from charsets in order, the next combination
+    of preferred variants of branches, and moves repetition counts one step
+    further from the preferred ones.
+    """
+    def __init__(self, *args, **kwargs):
+        super(DeterministicReversal, self).__init__(*args, **kwargs)
+        self._bounds = {}
+        self._group_bounds = {}
+        self._fallback = 0  # number of failed attempts
+        self._index_fallback = 0  # its part left for _pick_index()
+
+    def perform(self):
+        if self.has_assertions and self.regex is None:
+            raise ValueError(
+                "compiled regex is required to reverse assertions")
+
+        initial_groups = list(self.groups)
+        self.attempts = 0
+        error = None
+        while self.attempts < self.MAX_ASSERTION_ATTEMPTS:
+            self._fallback = self._index_fallback = self.attempts
+            self.attempts += 1
+
+            self.groups = list(initial_groups)
+            self._reset_constraints()
+            try:
+                result = self._reverse_nodes(self.regex_ast)
+            except ValueError as e:
+                error = e
+                continue
+            if not self.has_assertions:
+                return result
+            if fullmatch(self.regex, result):
+                assertion_stats.record(self.attempts, True)
+                return result
+
+        if not self.has_assertions:
+            raise error
+        assertion_stats.record(self.attempts, False)
+        raise ValueError(
+            "could not satisfy lookahead/lookbehind assertions "
+            "in %d attempts" % self.attempts)
+
+    def _pick(self, seq):
+        if not self._fallback:
+            return min(seq)
+        seq = sorted(seq)
+        return seq[self._fallback % len(seq)]
+
+    def _pick_index(self, scores, best):
+        """Return index of the score closest to ``best``,
+        or the next closest ones in later attempts.
+
+        Choices made in later attempts are the digits of the attempt number
+        in mixed radix, so that they go through all combinations of choices
+        of consecutive nodes, not just the ones where all of them are equal.
+        """
+        indices = sorted((abs(score - best), i)
+                         for i, score in enumerate(scores))
+        index = indices[self._index_fallback % len(indices)][1]
+        self._index_fallback //= len(indices)
+        return index
+
+    def _length_bounds(self, nodes):
+        """Return minimum and maximum length of strings matching
+        given sequence of regex AST nodes.
+
+        Maximum length takes ``MAX_REPEAT`` into account.
+        Results are memoized, so that computing bounds for all subpatterns
+        of the expression takes time linear in its size,
+        provided they are computed in order of the nodes.
+        """
+        key = id(nodes)
+        if key not in self._bounds:
+            min_length = max_length = 0
+            for node in nodes:
+                node_min, node_max = self._node_length_bounds(node)
+                min_length += node_min
+                max_length += node_max
+            self._bounds[key] = (min_length, max_length)
+        return self._bounds[key]
+
+    def _node_length_bounds(self, node):
+        """Return minimum and maximum length of strings matching
+        given node from regex AST.
+        """
+        type_, data = node
+
+        if type_ in (re.sre_parse.LITERAL, re.sre_parse.NOT_LITERAL,
+                     re.sre_parse.ANY, re.sre_parse.IN):
+            return 1, 1
+
+        if type_ == re.sre_parse.BRANCH:
+            bounds = [self._length_bounds(variant) for variant in data[1]]
+            return min(b[0] for b in bounds), max(b[1] for b in bounds)
+
+        if type_ in (re.sre_parse.MIN_REPEAT, re.sre_parse.MAX_REPEAT):
+            min_count, max_count = self._repeat_bounds(data)
+            min_length, max_length = self._length_bounds(data[-1])
+            return min_count * min_length, max_count * max_length
+
+        if type_ == re.sre_parse.SUBPATTERN:
+            index = data[0]
+            bounds = self._length_bounds(data[-1])
+            if index is not None:
+                if self.groups[index] is not None:
+                    bounds = (len(self.groups[index]),) * 2
+                self._group_bounds[index] = bounds
+            return bounds
+        if type_ == re.sre_parse.GROUPREF:
+            return self._group_bounds.get(data, (0, 0))
+        if type_ == re.sre_parse.GROUPREF_EXISTS:
+            _, yes_pattern, no_pattern = data
+            bounds = [self._length_bounds(yes_pattern), (0, 0)]
+            if no_pattern:
+                bounds[1] = self._length_bounds(no_pattern)
+            return min(b[0] for b in bounds), max(b[1] for b in bounds)
+
+        # assertions and anchors don't consume any characters,
+        # while unsupported nodes will be reported when reversing them
+        return 0, 0
+
+    def _repeat_bounds(self, node_data):
+        """Return minimum and (capped) maximum count of repeat node."""
+        min_count, max_count, _ = node_data
+        return min_count, max(min_count, min(max_count, self.MAX_REPEAT))
+
+    # Reversing regex AST nodes
+
+    def _reverse_literal_node(self, node_data):
+        char = self._chr(node_data)
+        if self.has_assertions:
+            self._consume_constraints(char)
+        return char
+
+    def _reverse_repeat_node(self, node_data):
+        count = self._repeat_count(node_data)
+        return self._reverse_repeated_nodes(node_data[-1], count)
+
+    def _reverse_branch_node(self, node_data):
+        _, variants = node_data
+        index = self._branch_index(node_data)
+        return self._reverse_nodes(variants[index], index)
+
+    def _repeat_count(self, node_data):
+        """Return how many times the repeat node should be repeated."""
+        raise NotImplementedError()
+
+    def _branch_index(self, node_data):
+        """Return index of the branch node's variant to reverse."""
+        raise NotImplementedError()
+
+
+class ShortestReversal(DeterministicReversal):
+    """Deterministic reversal that generates the shortest string
+    matching the regular expression.
+
+    The string is minimal except for the expressions where choosing
+    whether to match a capture group affects a conditional group later on,
+    or where the first attempt fails.
+    """
+    def perform(self):
+        self._length_bounds(self.regex_ast)
+        return super(ShortestReversal, self).perform()
+
+    def _repeat_count(self, node_data):
+        # make room for characters required by preceding lookaheads
+        min_count, max_count = self._repeat_bounds(node_data)
+        count = max(min_count, min(self._required_count(), max_count))
+        return min(count + self._fallback, max_count)
+
+    def _branch_index(self, node_data):
+        lengths = [self._length_bounds(variant)[0]
+                   for variant in node_data[1]]
+        return self._pick_index(lengths, min(lengths))
+
+
+class LongestReversal(DeterministicReversal):
+    """Deterministic reversal that generates the longest string
+    matching the regular expression,
+    where no repetition exceeds ``MAX_REPEAT``.
+    """
+    def perform(self):
+        self._length_bounds(self.regex_ast)
+        return super(LongestReversal, self).perform()
+
+    def _repeat_count(self, node_data):
+        min_count, max_count = self._repeat_bounds(node_data)
+        return max(min_count, max_count - self._fallback)
+
+    def _branch_index(self, node_data):
+        lengths = [self._length_bounds(variant)[1]
+                   for variant in node_data[1]]
+        return self._pick_index(lengths, max(lengths))
+
+
+class CoverageReversal(PathTrackingMixin, DeterministicReversal):
+    """Deterministic reversal that generates a set of strings
+    covering all options of choice nodes from regular expression AST.
+
+    Every string is generated by picking options which haven't been covered
+    by previous strings, or the first (simplest) option if there are none.
+    If the string doesn't satisfy assertions, it is generated again
+    with the same options, but other characters.
+    Strings are generated until one fails to cover anything new.
+    If none of them matched, options of every node are tried in turn
+    on every attempt, so that at least one string is found if possible.
+    """
+    def __init__(self, *args, **kwargs):
+        super(CoverageReversal, self).__init__(*args, **kwargs)
+        self.initial_groups = list(self.groups)
+
+        # nodes are identified by their paths, as ``sre_parse`` shares
+        # the same node object between e.g. all occurrences of ``\d``
+        self.node_coverage = []
+        self._nodes = {}
+        for path, (type_, data) in walk_choice_nodes(self.regex_ast):
+            options = self._node_options(type_, data)
+            coverage = NodeCoverage(path, str(type_).lower(), options)
+            self.node_coverage.append(coverage)
+            self._nodes[path] = coverage
+
+        self._hits = set()
+        self._failed = set()
+        self._rotate = False
+
+    def perform(self):
+        verify = self.has_assertions
+        if verify and self.regex is None:
+            raise ValueError(
+                "compiled regex is required to reverse assertions")
+
+        samples = []
+        while True:
+            result, matches = self._reverse_options(verify)
+
+            new_hits = self._hits - self._covered() - self._failed
+            if not new_hits and (samples or not matches):
+                break
+            if not matches:
+                # don't try these options again, but keep going
+                # in case the remaining ones lead to a match
+                self._failed |= new_hits
+                continue
+
+            samples.append(result)
+            for key, option in self._hits:
+                self._nodes[key].covered.add(option)
+
+        if not samples and verify:
+            # the options were probably not at fault individually,
+            # but only in combination with each other
+            self._rotate = True
+            result, matches = self._reverse_options(verify)
+            if matches:
+                samples.append(result)
+                for key, option in self._hits:
+                    self._nodes[key].covered.add(option)
+
+        if not samples:
+            raise ValueError(
+                "could not generate any string matching the expression")
+        return Coverage(samples, self.node_coverage)
+
+    def _reverse_options(self, verify):
+        """Generate string for the options that are preferred at the moment,
+        retrying with other characters if it doesn't match.
+
+        :return: Tuple of the string and whether it matches
+        """
+        attempts = self.MAX_ASSERTION_ATTEMPTS if verify else 1
+        for attempt in xrange(attempts):
+            self._fallback = attempt
+            self.groups = list(self.initial_groups)
+            self._reset_constraints()
+            self._hits = set()
+            try:
+                result = self._reverse_nodes(self.regex_ast)
+            except ValueError:
+                # e.g. reference to a group that the options skipped
+                return None, False
+            if not verify or fullmatch(self.regex, result):
+                return result, True
+        return result, False
+
+    def _node_options(self, type_, data):
+        """Return list of options to cover for given choice node."""
+        if type_ == re.sre_parse.BRANCH:
+            return list(xrange(len(data[1])))
+        if type_ in (re.sre_parse.MIN_REPEAT, re.sre_parse.MAX_REPEAT):
+            min_count, max_count = self._repeat_bounds(data)
+            return sorted(set([min_count,
+                               min(min_count + 1, max_count), max_count]))
+        if type_ == re.sre_parse.IN:
+            if str(data[0][0]).lower() == 'negate':
+                return [0]  # complement of the set is one big option
+            return list(xrange(len(data)))
+        if type_ == re.sre_parse.GROUPREF_EXISTS:
+            return ['yes', 'no']
+        raise ValueError("not a choice node: %s" % type_)
+
+    def _covered(self):
+        """Return set of (node path, option) pairs covered so far."""
+        return set((path, option)
+                   for path, coverage in self._nodes.items()
+                   for option in coverage.covered)
+
+    def _pending(self, nodes, path):
+        """Check whether given regex AST nodes contain any choice nodes
+        with options that haven't been covered or tried yet.
+
+        :param path: Path of the node containing ``nodes``, followed by
+                     the index of branch variant or conditional group's arm
+                     if ``nodes`` are one
+        """
+        for node_path, _ in walk_choice_nodes(nodes, path):
+            for option in self._nodes[node_path].uncovered:
+                hit = (node_path, option)
+                if not (hit in self._hits or hit in self._failed):
+                    return True
+        return False
+
+    def _choose_option(self, subpatterns=None):
+        """Pick option for the choice node currently being reversed,
+        preferring one that hasn't been covered or tried yet,
+        and then one that leads to such options in child nodes.
+
+        :param subpatterns: Function returning child nodes reached
+                            through given option, together with their path
+                            (as in :meth:`_pending`)
+        """
+        path = self._path
+        coverage = self._nodes[path]
+        if self._rotate:
+            option = coverage.options[self._fallback % len(coverage.options)]
+            self._hits.add((path, option))
+            return option
+
+        for option in coverage.options:
+            hit = (path, option)
+            if hit in self._hits or hit in self._failed:
+                continue
+            if option not in coverage.covered:
+                break
+        else:
+            # fall back to options which haven't led to a failure
+            options = [opt for opt in coverage.options
+                       if (path, opt) not in self._failed] or coverage.options
+            option = options[0]
+            if subpatterns is not None:
+                for opt in options:
+                    if self._pending(*subpatterns(opt)):
+                        option = opt
+                        break
+
+        self._hits.add((path, option))
+        return option
+
+    # Reversing regex AST nodes
+
+    def _reverse_in_node(self, node_data):
+        index = self._choose_option()
+        if str(node_data[0][0]).lower() == 'negate':
+            return self._choose_char(list(self._in_charset(node_data)))
+        return self._choose_char(list(self._in_charset([node_data[index]])))
+
+    def _repeat_count(self, node_data):
+        what, path = node_data[-1], self._path
+        return self._choose_option(
+            lambda count: (what if count else [], path))
+
+    def _branch_index(self, node_data):
+        _, variants = node_data
+        path = self._path
+        return self._choose_option(
+            lambda index: (variants[index], path + (index,)))
+
+    def _reverse_groupref_exists_node(self, node_data):
+        arm = 'yes' if self.groups[node_data[0]] is not None else 'no'
+        self._hits.add((self._path, arm))
+        return super(CoverageReversal, self) \
+            ._reverse_groupref_exists_node(node_data)
+
+
+def walk_nodes(nodes, path=(), ancestors=()):
+    """Generate all nodes from regex AST, in preorder.
+
+    Nodes inside lookahead/lookbehind assertions are skipped,
+    as those never contribute to the generated string.
+
+    :return: Iterable of (path, node, ancestors) tuples, where ``path``
+             is a tuple of indices leading to the node, and ``ancestors``
+             is a tuple of (node, index) pairs for the nodes containing it;
+             ``index`` is the branch variant or conditional group's arm
+             which contains the node, or ``None`` for other node types
+    """
+    for i, node in enumerate(nodes):
+        type_, data = node
+        node_path = path + (i,)
+        yield node_path, node, ancestors
+
+        if type_ == re.sre_parse.BRANCH:
+            for j, variant in enumerate(data[1]):
+                for item in walk_nodes(variant, node_path + (j,),
+                                       ancestors + ((node, j),)):
+                    yield item
+        elif type_ in (re.sre_parse.MIN_REPEAT, re.sre_parse.MAX_REPEAT,
+                       re.sre_parse.SUBPATTERN):
+            for item in walk_nodes(data[-1], node_path,
+                                   ancestors + ((node, None),)):
+                yield item
+        elif type_ == re.sre_parse.GROUPREF_EXISTS:
+            for j, pattern in enumerate(data[1:]):
+                if pattern:
+                    for item in walk_nodes(pattern, node_path + (j,),
+                                           ancestors + ((node, j),)):
+                        yield item
+
+
+def walk_choice_nodes(nodes, path=()):
+    """Generate nodes from regex AST which involve making a choice
+    when reversing them, i.e. branches, repeats, charsets
+    and conditional groups.
+
+    :return: Iterable of (path, node) tuples, where ``path`` is a tuple
+             of indices leading to the node
+    """
+    choice_types = (re.sre_parse.BRANCH, re.sre_parse.MIN_REPEAT,
+                    re.sre_parse.MAX_REPEAT, re.sre_parse.IN,
+                    re.sre_parse.GROUPREF_EXISTS)
+    for node_path, node, _ in walk_nodes(nodes, path):
+        if node[0] in choice_types:
+            yield node_path, node
+
+
+class NegativeReversal(PathTrackingMixin, Reversal):
+    """Reversal which generates strings that don't match
+    the regular expression.
+
+    Every string is generated by picking one of the applicable mutations
+    of a single node from regex AST, and applying it to the first occurrence
+    of the node while reversing the rest of the expression as usual.
+    The node is identified by its path, as ``sre_parse`` shares node objects
+    between e.g. all occurrences of ``\\d``. Branches and repetitions
+    containing the node are forced to include it. The result is then checked
+    against the regex, as a mutation may still be matched by other parts
+    of the expression.
+    """
+    MAX_NEGATIVE_ATTEMPTS = 128
+    ALWAYS_VERIFY = True
+
+    def __init__(self, *args, **kwargs):
+        super(NegativeReversal, self).__init__(*args, **kwargs)
+        self.initial_groups = list(self.groups)
+
+        self.sites = []
+        for path, node, ancestors in walk_nodes(self.regex_ast):
+            if self._has_predefined_group(ancestors):
+                continue  # such subpatterns are never reversed
+            for mutation in self._node_mutations(node):
+                self.sites.append((path, mutation))
+
+        self._target = None
+        self._mutation = None
+        self._mutated = False
+
+    def perform(self):
+        if self.regex is None:
+            raise ValueError("compiled regex is required to verify results")
+        if not self.sites:
+            raise ValueError("expression has no elements to mutate")
+
+        for _ in xrange(self.MAX_NEGATIVE_ATTEMPTS):
+            path, mutation = random.choice(self.sites)
+            result = self._perform_mutation(path, mutation)
+            if result is not None and not fullmatch(self.regex, result):
+                return NegativeSample(result, mutation, path)
+
+        raise ValueError(
+            "could not generate non-matching string "
+            "in %d attempts" % self.MAX_NEGATIVE_ATTEMPTS)
+
+    def _perform_mutation(self, path, mutation):
+        """Reverse the expression while applying given mutation
+        to the node at given path.
+
+        :return: Mutated string, or ``None`` if the node wasn't reached
+        """
+        self.groups = list(self.initial_groups)
+        self._reset_constraints()
+
+        self._target = path
+        self._mutation = mutation
+        self._mutated = False
+
+        result = self._reverse_nodes(self.regex_ast)
+        return result if self._mutated else None
+
+    def _has_predefined_group(self, ancestors):
+        """Check whether any of the ancestors is a capture group
+        with predefined value.
+        """
+        for (type_, data), _ in ancestors:
+            if type_ == re.sre_parse.SUBPATTERN and data[0] is not None:
+                if self.initial_groups[data[0]] is not None:
+                    return True
+        return False
+
+    def _node_mutations(self, node):
+        """Return list of mutations applicable to given node."""
+        type_, data = node
+
+        if type_ in (re.sre_parse.LITERAL, re.sre_parse.NOT_LITERAL,
+                     re.sre_parse.ANY, re.sre_parse.IN):
+            if self._complement(node):
+                return ['charset']
+            return []  # e.g. ``.`` with re.DOTALL
+        if type_ in (re.sre_parse.MIN_REPEAT, re.sre_parse.MAX_REPEAT):
+            min_count, max_count, _ = data
+            mutations = []
+            if max_count < re.sre_parse.MAXREPEAT:
+                mutations.append('repeat_over')
+            if min_count > 0:
+                mutations.append('repeat_under')
+            return mutations
+        if type_ == re.sre_parse.GROUPREF:
+            return ['groupref']
+        return []
+
+    # Reversing regex AST nodes
+
+    def _leads_to_target(self):
+        """Check whether the node currently being reversed
+        contains the node to mutate.
+        """
+        return self._target[:len(self._path)] == self._path
+
+    def _reverse_node(self, node):
+        if self._path == self._target and not self._mutated:
+            self._mutated = True
+            return self._reverse_mutated_node(node)
+        return super(NegativeReversal, self)._reverse_node(node)
+
+    def _reverse_mutated_node(self, node):
+        """Generates string which *doesn't* match given node
+        from regular expression AST, according to current mutation.
+        """
+        type_, data = node
+
+        if self._mutation == 'charset':
+            return random.choice(self._complement(node))
+        if self._mutation == 'repeat_over':
+            min_count, max_count, what = data
+            return self._reverse_repeated_nodes(what, max_count + 1)
+        if self._mutation == 'repeat_under':
+            min_count, max_count, what = data
+            return self._reverse_repeated_nodes(what, min_count - 1)
+        if self._mutation == 'groupref':
+            value = self.groups[data]
+            if not value:
+                return random.choice(self._charset('any'))
+            i = random.randrange(len(value))
+            excluded = value[i:i + 1]
+            excluded = (excluded.lower(), excluded.upper()) \
+                if self.flags & re.IGNORECASE else (excluded,)
+            return value[:i] + random.choice(self._negate(excluded)) + \
+                value[i + 1:]
+
+        raise ValueError("invalid mutation: %s" % self._mutation)
+
+    def _complement(self, node):
+        """Return characters *not* matched by given single-character node
+        from regex AST.
+        """
+        if node[0] == re.sre_parse.ANY and not self.flags & re.DOTALL:
+            # ``_negate()`` never returns newline, which is exactly
+            # the character that ``.`` doesn't match without re.DOTALL
+            return self._chars("\n")
+        return self._negate(self._node_charset(node))
+
+    def _reverse_groupref_node(self, node_data):
+        if self.groups[node_data] is None:
+            # reference to unmatched group (e.g. due to ``repeat_under``)
+            # makes the whole string fail to match regardless of its value
+            return self._str()
+        return super(NegativeReversal, self)._reverse_groupref_node(node_data)
+
+    def _reverse_repeat_node(self, node_data):
+        min_count, max_count, what = node_data
+        max_count = min(max_count, self.MAX_REPEAT)
+        if self._leads_to_target():
+            min_count = max(min_count, min(1, max_count))
+
+        count = random.randint(min_count, max_count)
+        return self._reverse_repeated_nodes(what, count)
+
+    def _reverse_branch_node(self, node_data):
+        _, variants = node_data
+        if self._leads_to_target():
+            index = self._target[len(self._path)]
+        else:
+            index = random.randrange(len(variants))
+        return self._reverse_nodes(variants[index], index)
+
+
+class CompletionReversal(Reversal):
+    """Reversal which generates a string starting with given prefix.
+
+    The prefix is matched against regex AST nodes first, which determines
+    the values of capture groups it covers. Once the whole prefix is matched,
+    the remaining nodes are reversed as usual. If the result doesn't satisfy
+    assertions, other ways of matching the prefix are tried in turn.
+
+    Matching is a depth-first search over states, each consisting of
+    the position in prefix, the stack of tasks that remain to be matched,
+    and values of capture groups. Tasks are tuples of:
+
+    * ``('nodes', nodes, index)`` -- match ``nodes`` from given ``index``
+    * ``('repeat', node_data, count, start)`` -- repeat node after ``count``
+      repetitions, where the last one has started at position ``start``
+    * ``('group', index, start)`` -- end of capture group started at ``start``
+    * ``('text', text)`` -- rest of a capture group's value
+      which the prefix ends in the middle of
+
+    Stack is a linked list of (task, rest) pairs, or ``None`` if empty.
+    States that match the rest of the prefix in the same way as already
+    visited ones are skipped, so for expressions without backreferences
+    and bounded repetitions, matching takes time linear in prefix length.
+    """
+    CATEGORY_REGEXES = {
+        'digit': r'\d',
+        'word': r'\w',
+        'space': r'\s',
+    }
+
+    def complete(self, prefix):
+        """Generate string which starts with ``prefix``
+        and matches the regular expression.
+        """
+        verify = self.has_assertions
+        if verify and self.regex is None:
+            raise ValueError(
+                "compiled regex is required to reverse assertions")
+
+        self.prefix = prefix
+        self.initial_groups = list(self.groups)
+        self._has_refs = any(
+            node[0] in (re.sre_parse.GROUPREF, re.sre_parse.GROUPREF_EXISTS)
+            for _, node, _ in walk_nodes(self.regex_ast))
+
+        # the prefix may be matched in several ways (e.g. ``a`` in ``a?ab?``),
+        # and only some of them may lead to strings satisfying assertions,
+        # so every retry starts from the next one, until all have been tried
+        matches = self._match_prefix()
+        states = []
+        self.attempts = 0
+        while self.attempts < self.MAX_ASSERTION_ATTEMPTS:
+            state = next(matches, None)
+            if state is not None:
+                states.append(state)
+            elif not states:
+                raise ValueError(
+                    "no match can start with prefix: %r" % (prefix,))
+            else:
+                state = states[self.attempts % len(states)]
+            self.attempts += 1
+            self._reset_constraints()
+
+            tasks, groups, assertions = state
+            self._replay_assertions(assertions)
+            result = prefix + self._complete_rest(tasks, groups)
+            if not verify:
+                return result
+            if fullmatch(self.regex, result):
+                assertion_stats.record(self.attempts, True)
+                return result
+
+        assertion_stats.record(self.attempts, False)
+        raise ValueError(
+            "could not satisfy lookahead/lookbehind assertions "
+            "in %d attempts" % self.attempts)
+
+    def _match_prefix(self):
+        """Match the whole prefix against regex AST.
+
+        :return: Iterator over the ways of matching the prefix,
+                 in order of preference, as tuples of (tasks, groups)
+                 remaining after the prefix has been matched, together
+                 with the assertions passed on the way as a linked list
+                 of ((position, node), rest)
+        """
+        assertion_types = (re.sre_parse.ASSERT, re.sre_parse.ASSERT_NOT)
+
+        end = len(self.prefix)
+        states = [(0, (('nodes', self.regex_ast, 0), None),
+                   tuple(self.initial_groups), None)]
+        visited = set()
+        while states:
+            pos, tasks, groups, assertions = states.pop()
+            key = self._state_key(pos, tasks, groups)
+            if key in visited:
+                continue
+            visited.add(key)
+
+            if pos == end:
+                yield tasks, groups, assertions
+                continue
+
+            if self.has_assertions and tasks is not None:
+                task = tasks[0]
+                if task[0] == 'nodes' and task[2] < len(task[1]) and \
+                        task[1][task[2]][0] in assertion_types:
+                    assertions = ((pos, task[1][task[2]]), assertions)
+            states.extend((pos, tasks, groups, assertions)
+                          for pos, tasks, groups
+                          in reversed(self._next_states(pos, tasks, groups)))
+
+    def _replay_assertions(self, assertions):
+        """Turn assertions passed while matching the prefix into hints
+        for the rest of the string, as if the prefix had been generated.
+
+        :param assertions: Linked list of ((position, node), rest),
+                           as returned by :meth:`_match_prefix`
+        """
+        passed = []
+        while assertions is not None:
+            item, assertions = assertions
+            passed.append(item)
+        if not passed:
+            return
+
+        pos = passed[-1][0]
+        for assertion_pos, node in reversed(passed):
+            for i in xrange(pos, assertion_pos):
+                self._consume_constraints(self.prefix[i:i + 1])
+            self._reverse_node(node)
+            pos = assertion_pos
+        for i in xrange(pos, len(self.prefix)):
+            self._consume_constraints(self.prefix[i:i + 1])
+
+    def _complete_rest(self, tasks, groups):
+        """Generate the rest of the string, once the prefix is matched.
+
+        :return: Suffix to append to the prefix
+        """
+        self.groups = list(groups)
+
+        suffix = self._str()
+        while tasks is not None:
+            task, tasks = tasks
+            kind = task[0]
+            if self.has_assertions and kind in ('nodes', 'repeat'):
+                self._trailing_charsets = self._enclosing_hint(tasks)
+            if kind == 'nodes':
+                _, nodes, index = task
+                suffix += self._reverse_nodes(nodes[index:])
+            elif kind == 'repeat':
+                _, (min_count, max_count, what), count, _ = task
+                min_more = max(min_count - count, 0)
+                max_more = max(min_more,
+                               min(max_count, self.MAX_REPEAT) - count)
+                if self.has_assertions:
+                    # make room for characters required by lookaheads
+                    min_more = max(min_more,
+                                   min(self._required_count(), max_more))
+                more = random.randint(min_more, max_more)
+                suffix += self._reverse_repeated_nodes(what, more)
+            elif kind == 'group':
+                _, index, start = task
+                self.groups[index] = self.prefix[start:] + suffix
+            else:
+                suffix += task[1]
+        return suffix
+
+    def _enclosing_hint(self, tasks):
+        """Return charsets for the last characters generated by the task
+        preceding given ones, from lookbehinds which follow the node
+        it belongs to, as in :meth:`_lookbehind_hints`.
+        """
+        while tasks is not None and tasks[0][0] == 'group':
+            tasks = tasks[1]
+        if tasks is None or tasks[0][0] != 'nodes':
+            return None
+        (_, nodes, index), rest = tasks
+        if index == 0:
+            return None
+        # the node may be last in its sequence, followed by a lookbehind
+        # further up the tree
+        self._trailing_charsets = self._enclosing_hint(rest)
+        hints = self._lookbehind_hints(nodes[index - 1:])
+        return hints and hints[1].get(0)
+
+    def _state_key(self, pos, tasks, groups):
+        """Return key identifying the state in prefix matching.
+
+        States with equal keys match the rest of the prefix
+        in the same way, although they may have been reached differently
+        (e.g. through different number of unbounded repetitions).
+        """
+        key = [pos]
+        while tasks is not None:
+            task, tasks = tasks
+            kind = task[0]
+            if kind == 'nodes':
+                key.append((kind, id(task[1]), task[2]))
+            elif kind == 'repeat':
+                _, node_data, count, start = task
+                min_count, max_count, _ = node_data
+                if max_count == re.sre_parse.MAXREPEAT:
+                    # only matters in comparison with ``min_count``
+                    count = min(count, min_count + 1)
+                key.append((kind, id(node_data), count, start == pos))
+            elif kind == 'text':
+                key.append(task)
+            else:
+                _, index, start = task
+                key.append((kind, index, start if self._has_refs else None))
+
+        # values of capture groups only matter if they are referenced
+        if self._has_refs:
+            key.append(groups)
+        return tuple(key)
+
+    # Matching prefix against regex AST nodes
+
+    def _next_states(self, pos, tasks, groups):
+        """Return states that follow given one, in order of preference."""
+        if tasks is None:
+            return []  # expression ended before the prefix did
+        task, rest = tasks
+        kind = task[0]
+
+        if kind == 'repeat':
+            _, node_data, count, start = task
+            min_count, max_count, what = node_data
+            if count > min_count and pos == start:
+                return []  # empty repetition would loop forever
+
+            # try to match as many repetitions as possible first
+            states = []
+            if count < max_count:
+                repeat = ('repeat', node_data, count + 1, pos)
+                states.append((pos, (('nodes', what, 0), (repeat, rest)),
+                               groups))
+            if count >= min_count:
+                states.append((pos, rest, groups))
+            return states
+
+        if kind == 'group':
+            _, index, start = task
+            groups = groups[:index] + (self.prefix[start:pos],) + \
+                groups[index + 1:]
+            return [(pos, rest, groups)]
+
+        _, nodes, index = task
+        if index == len(nodes):
+            return [(pos, rest, groups)]
+        tasks = (('nodes', nodes, index + 1), rest)
+        return self._node_states(nodes[index], pos, tasks, groups)
+
+    def _node_states(self, node, pos, tasks, groups):
+        """Return states which result from matching the prefix
+        at position ``pos`` against given node.
+        """
+        type_, data = node
+
+        if type_ in (re.sre_parse.LITERAL, re.sre_parse.NOT_LITERAL,
+                     re.sre_parse.ANY, re.sre_parse.IN):
+            if not self._char_matches(node, self.prefix[pos:pos + 1]):
+                return []
+            return [(pos + 1, tasks, groups)]
+
+        if type_ == re.sre_parse.BRANCH:
+            variants = list(data[1])
+            random.shuffle(variants)
+            return [(pos, (('nodes', variant, 0), tasks), groups)
+                    for variant in variants]
+
+        if type_ in (re.sre_parse.MIN_REPEAT, re.sre_parse.MAX_REPEAT):
+            return [(pos, (('repeat', data, 0, pos), tasks), groups)]
+
+        if type_ == re.sre_parse.SUBPATTERN:
+            index = data[0]
+            nodes = data[-1]
+            if index is not None:
+                if self.initial_groups[index] is not None:
+                    return self._value_states(groups[index],
+                                              pos, tasks, groups)
+                tasks = (('group', index, pos), tasks)
+            return [(pos, (('nodes', nodes, 0), tasks), groups)]
+        if type_ == re.sre_parse.GROUPREF:
+            return self._value_states(groups[data], pos, tasks, groups)
+        if type_ == re.sre_parse.GROUPREF_EXISTS:
+            index, yes_pattern, no_pattern = data
+            nodes = yes_pattern if groups[index] is not None else no_pattern
+            if nodes:
+                tasks = (('nodes', nodes, 0), tasks)
+            return [(pos, tasks, groups)]
+
+        if type_ in (re.sre_parse.ASSERT, re.sre_parse.ASSERT_NOT,
+                     re.sre_parse.AT):
+            # assertions are verified once the whole string is generated
+            return [(pos, tasks, groups)]
+
+        raise NotImplementedError(
+            "unsupported regular expression element: %s" % type_)
+
+    def _value_states(self, value, pos, tasks, groups):
+        """Return states which result from matching the prefix
+        against known value of a capture group.
+        """
+        if value is None:
+            return []  # reference to a group that didn't match
+
+        remaining = self.prefix[pos:pos + len(value)]
+        if not value.startswith(remaining):
+            return []
+        if len(remaining) == len(value):
+            return [(pos + len(value), tasks, groups)]
+        return [(len(self.prefix), (('text', value[len(remaining):]), tasks),
+                 groups)]
+
+    def _char_matches(self, node, char):
+        """Check whether given single-character node matches ``char``."""
+        type_, data = node
+
+        if type_ == re.sre_parse.LITERAL:
+            return self._chars_equal(self._chr(data), char)
+        if type_ == re.sre_parse.NOT_LITERAL:
+            return not self._chars_equal(self._chr(data), char)
+        if type_ == re.sre_parse.ANY:
+            return char not in ("\n", b"\n") or bool(self.flags & re.DOTALL)
+
+        negate = str(data[0][0]).lower() == 'negate'
+        if negate:
+            data = data[1:]
+
+        matches = False
+        for item_type, item_data in data:
+            if item_type == re.sre_parse.LITERAL:
+                matches = self._chars_equal(self._chr(item_data), char)
+            elif item_type == re.sre_parse.RANGE:
+                min_char, max_char = imap(self._chr, item_data)
+                variants = (char, char.lower(), char.upper()) \
+                    if self.flags & re.IGNORECASE else (char,)
+                matches = any(min_char <= c <= max_char for c in variants)
+            elif item_type == re.sre_parse.CATEGORY:
+                item_data = str(item_data).lower()  # for Python 3.5+
+                _, what = item_data.rsplit('_', 1)
+                category_re = self.CATEGORY_REGEXES[what]
+                if IS_PY3 and isinstance(char, bytes):
+                    # bytes need a bytes pattern, which is also
+                    # the only kind that can use re.LOCALE
+                    category_re = category_re.encode('ascii')
+                matches = re.match(category_re, char, self.flags &
+                                   (re.UNICODE | re.LOCALE)) is not None
+                if '_not_' in item_data:
+                    matches = not matches
+            else:
+                raise ValueError(
+                    "invalid charset alternative: %s" % item_type)
+            if matches:
+                break
+
+        return matches != negate
+
+    def _chars_equal(self, a, b):
+        if self.flags & re.IGNORECASE:
+            return a.lower() == b.lower()
+        return a == b
+
+
+STRATEGIES = {
+    'random': Reversal,
+    'shortest': ShortestReversal,
+    'longest': LongestReversal,
+}
@@ -0,0 +1,576 @@
+"""
+unmatcher_fuzz :: Differential fuzz testing harness for unmatcher
+
+Generates random regular expressions from the subset supported by unmatcher,
+compiles them with random flags as either text or bytes patterns,
+reverses each of them many times in a pool of worker processes
+(and also completes prefixes, covers, and generates non-matching strings),
+and checks every result against the ``re`` module.
+Failing expressions are shrunk to minimal ones that still fail.
+
+Usage::
+
+    python -m unmatcher_fuzz [--patterns N] [--samples M] [--processes P]
+                             [--seed S] [--max-depth D]
+"""
+import argparse
+import multiprocessing
+import random
+import re
+import string
+import sys
+import time
+
+import unmatcher
+
+
+def main(argv=None):
+    """Entry point of the harness.
+
+    :return: Exit code: 0 if all checks passed, 1 if there were failures
+    """
+    args = parse_args(argv)
+    seed = random.randrange(2 ** 32) if args.seed is None else args.seed
+
+    print("Fuzzing unmatcher with %d patterns, %d samples each (seed: %d)" % (
+        args.patterns, args.samples, seed))
+
+    cases = [(seed + i, args.samples, args.max_depth)
+             for i in range(args.patterns)]
+    start = time.time()
+    processes = args.processes or multiprocessing.cpu_count()
+    if processes == 1:
+        results = list(map(run_case, cases))
+    else:
+        pool = multiprocessing.Pool(processes)
+        chunksize = max(1, len(cases) // (4 * processes))
+        try:
+            results = pool.map(run_case, cases, chunksize=chunksize)
+        finally:
+            pool.close()
+            pool.join()
+    elapsed = time.time() - start
+
+    checks = sum(result['checks'] for result in results)
+    print("Performed %d checks in %.2fs (%.0f checks/s)" % (
+        checks, elapsed, checks / elapsed if elapsed else float('inf')))
+
+    failures = [result for result in results if result['failure']]
+    if not failures:
+        print("No failures.")
+        return 0
+
+    print("%d failing pattern(s):" % len(failures))
+    node_type_counts = {}
+    for result in failures:
+        flags, as_bytes = result['flags'], result['bytes']
+        tree = shrink(result['tree'], result['seed'], args.samples,
+                      flags, as_bytes)
+        pattern = render(tree)
+        failure = check_pattern(encode(pattern, as_bytes), result['seed'],
+                                args.samples, flags)
+
+        print("")
+        print("  seed:     %d" % result['seed'])
+        print("  flags:    %s%s" % (format_flags(flags),
+                                    " (bytes)" if as_bytes else ""))
+        print("  pattern:  %s" % render(result['tree']))
+        print("  shrunk:   %s" % pattern)
+        print("  failure:  %s" % format_failure(failure))
+
+        for node_type in set(node_types(pattern)):
+            node_type_counts.setdefault(node_type, 0)
+            node_type_counts[node_type] += 1
+
+    print("")
+    print("Failures per node type:")
+    for node_type, count in sorted(node_type_counts.items(),
+                                   key=lambda item: (-item[1], item[0])):
+        print("  %-16s %d" % (node_type, count))
+    return 1
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m unmatcher_fuzz',
+        description="Differential fuzz testing harness for unmatcher")
+    parser.add_argument('--patterns', '-n', type=int, default=200,
+                        help="number of random patterns to generate")
+    parser.add_argument('--samples', '-m', type=int, default=100,
+                        help="number of random reversals of every pattern")
+    parser.add_argument('--processes', '-p', type=int, default=None,
+                        help="number of worker processes "
+                             "(default: number of CPUs)")
+    parser.add_argument('--seed', '-s', type=int, default=None,
+                        help="seed for the first pattern (default: random)")
+    parser.add_argument('--max-depth', '-d', type=int, default=3,
+                        help="maximum nesting depth of generated patterns")
+    return parser.parse_args(argv)
+
+
+# Running the checks
+
+def run_case(case):
+    """Generate a random pattern and check unmatcher against it.
+
+    :param case: Tuple of (seed, samples, max_depth)
+    :return: Dictionary with the ``seed``, ``tree``, ``pattern``,
+             ``flags`` and ``bytes`` mode that were checked,
+             number of ``checks`` performed and the ``failure`` (if any)
+    """
+    seed, samples, max_depth = case
+    generator = RegexGenerator(random.Random(seed), max_depth)
+    tree = generator.generate()
+    flags, as_bytes = generator.generate_options()
+    pattern = encode(render(tree), as_bytes)
+    stats = {'checks': 0}
+    failure = check_pattern(pattern, seed, samples, flags, stats)
+    return {
+        'seed': seed,
+        'tree': tree,
+        'pattern': pattern,
+        'flags': flags,
+        'bytes': as_bytes,
+        'checks': stats['checks'],
+        'failure': failure,
+    }
+
+
+COMPLETE_SAMPLES = 2
+NEGATIVE_SAMPLES = 2
+
+
+def check_pattern(pattern, seed, samples, flags=0, stats=None):
+    """Check results of unmatcher's functions for given pattern.
+
+    The global random number generator is seeded with ``seed``,
+    so that a failure can be reproduced.
+
+    :param pattern: Pattern string, either text or bytes
+    :param flags: Flags to compile the pattern with
+    :param stats: Optional dictionary whose ``'checks'`` counter is increased
+                  by the number of results actually checked against ``re``
+
+    :return: ``None`` if all results were correct, or a dictionary
+             describing the first failure: ``function`` that failed
+             and either the ``string`` it produced or the ``error`` it raised
+    """
+    try:
+        regex = re.compile(pattern, flags)
+        # results are checked by ``re`` alone, independently of unmatcher;
+        # ``regex.fullmatch`` is only available since Python 3.4
+        fullmatch = getattr(regex, 'fullmatch', None) or \
+            re.compile(r'(?:%s)\Z' % pattern, flags).match
+    except Exception as e:  # some Python versions raise RuntimeError
+        return {'function': 're.compile', 'error': e}
+
+    if stats is None:
+        stats = {'checks': 0}
+
+    def matches(string):
+        stats['checks'] += 1
+        return fullmatch(string) is not None
+
+    # expressions with assertions may have no matches at all (e.g. ``(?=a)b``),
+    # and random reversal may fail for them anyway; once it has succeeded,
+    # though, the functions which don't rely on luck must not fail
+    has_assertions = unmatcher.has_assertions(re.sre_parse.parse(pattern).data)
+    found = []
+
+    def tolerated(name, error):
+        return has_assertions and isinstance(error, unmatcher.ReversalError) \
+            and (name == 'reverse' or not found)
+
+    random.seed(seed)
+    calls = [('reverse', lambda: unmatcher.reverse(regex))] * samples
+    calls.extend([
+        ("reverse(strategy='shortest')",
+         lambda: unmatcher.reverse(regex, strategy='shortest')),
+        ("reverse(strategy='longest')",
+         lambda: unmatcher.reverse(regex, strategy='longest')),
+    ])
+    for name, func in calls:
+        try:
+            result = func()
+        except Exception as e:
+            if tolerated(name, e):
+                continue
+            return {'function': name, 'error': e}
+        if not matches(result):
+            return {'function': name, 'string': result}
+        found.append(result)
+
+    # every prefix of a matching string can be completed
+    for match in found[:COMPLETE_SAMPLES]:
+        prefix = match[:random.randint(0, len(match))]
+        name = 'complete(%r)' % (prefix,)
+        try:
+            result = unmatcher.complete(regex, prefix)
+        except Exception as e:
+            return {'function': name, 'error': e}
+        if not result.startswith(prefix) or not matches(result):
+            return {'function': name, 'string': result}
+
+    try:
+        coverage = unmatcher.cover(regex).samples
+    except Exception as e:
+        if not tolerated('cover', e):
+            return {'function': 'cover', 'error': e}
+        coverage = []
+    for sample in coverage:
+        if not matches(sample):
+            return {'function': 'cover', 'string': sample}
+
+    # negative samples may legitimately be impossible to generate
+    # (e.g. for ``(?s).*``), so only check the ones that were
+    try:
+        negatives = unmatcher.reverse_negative(regex, NEGATIVE_SAMPLES)
+    except unmatcher.ReversalError:
+        negatives = []
+    except Exception as e:
+        return {'function': 'reverse_negative', 'error': e}
+    for sample in negatives:
+        if matches(sample.string):
+            return {'function': 'reverse_negative (%s)' % sample.mutation,
+                    'string': sample.string}
+
+    return None
+
+
+def format_flags(flags):
+    names = [name for name, flag in RegexGenerator.FLAGS if flags & flag]
+    return '|'.join(names) or '0'
+
+
+def format_failure(failure):
+    if failure is None:
+        return "(not reproduced)"
+    if 'error' in failure:
+        error = failure['error']
+        return "%s raised %s: %s" % (
+            failure['function'], error.__class__.__name__, error)
+    return "%s returned non-matching string %r" % (
+        failure['function'], failure['string'])
+
+
+def node_types(pattern):
+    """Return list of types of regex AST nodes in given pattern."""
+    try:
+        ast = re.sre_parse.parse(pattern)
+    except re.error:
+        return []
+    return [str(node[0]).lower()
+            for _, node, _ in unmatcher.walk_nodes(ast.data)]
+
+
+# Generating random patterns
+
+class RegexGenerator(object):
+    """Generates random regular expressions from the subset of syntax
+    supported by unmatcher, as trees of tuples that can be turned
+    into patterns with :func:`render`.
+
+    Tree nodes are:
+
+    * ``('literal', char)``
+    * ``('any',)``
+    * ``('category', letter)``, e.g. ``('category', 'd')`` for ``\\d``
+    * ``('set', negate, items)``, where items are ``('char', c)``,
+      ``('range', a, b)`` or ``('category', letter)``;
+      negated sets don't contain categories, so they are never empty
+    * ``('seq', nodes)`` and ``('alt', nodes)``
+    * ``('group', name_or_none, child)`` for capture groups,
+      ``('group', False, child)`` for non-capture ones
+    * ``('repeat', child, min, max_or_none, lazy)``
+    * ``('backref', index)``
+    * ``('cond', index, yes, no)``
+    * ``('assert', kind, child)``, where kind is ``'='``, ``'!'``,
+      ``'<='`` or ``'<!'``, and child is a sequence of single-character
+      nodes, which lookaheads may precede with ``.*``
+
+    Repeated subpatterns never contain other repeats, alternatives
+    or conditionals, as those can make the ``re`` module backtrack
+    exponentially when checking strings that don't match.
+    """
+    ALPHABET = string.ascii_letters + string.digits + '_-.*+?()[]{}|^$\\ '
+    CATEGORIES = 'dDwWsS'
+    FLAGS = [('re.I', re.IGNORECASE), ('re.S', re.DOTALL),
+             ('re.M', re.MULTILINE)]
+
+    def __init__(self, rng, max_depth=3):
+        """Constructor.
+
+        :param rng: ``random.Random`` object to use
+        :param max_depth: Maximum nesting depth of the generated tree
+        """
+        self.rng = rng
+        self.max_depth = max_depth
+        self.group_count = 0
+        self.closed_groups = []  # (index, is_optional) pairs
+        self.in_repeat = False
+
+    def generate(self):
+        return self._seq(self.max_depth, optional=False)
+
+    def generate_options(self):
+        """Return random ``(flags, as_bytes)`` pair: combination of flags
+        to compile the pattern with, and whether it should be a bytes pattern.
+        """
+        flags = 0
+        for _, flag in self.FLAGS:
+            if self.rng.random() < 0.25:
+                flags |= flag
+        return flags, self.rng.random() < 0.25
+
+    def _seq(self, depth, optional):
+        length = self.rng.randint(1, 4)
+        return ('seq', [self._node(depth, optional) for _ in range(length)])
+
+    def _node(self, depth, optional):
+        kinds = ['char'] * 8
+        if depth > 0:
+            kinds.append('group')
+            if not self.in_repeat:
+                kinds.extend(['repeat', 'repeat', 'alt', 'assert'])
+                if self.closed_groups:
+                    kinds.append('cond')
+        if any(not opt for _, opt in self.closed_groups):
+            kinds.append('backref')
+        kind = self.rng.choice(kinds)
+
+        if kind == 'char':
+            return self._char()
+        if kind == 'group':
+            return self._group(depth - 1, optional, self._seq)
+        if kind == 'alt':
+            return self._group(depth - 1, optional, self._alt)
+        if kind == 'repeat':
+            return self._repeat(depth - 1, optional)
+        if kind == 'backref':
+            # only refer to groups that are always matched,
+            # as references to unmatched groups fail to match anything
+            indices = [i for i, opt in self.closed_groups if not opt]
+            return ('backref', self.rng.choice(indices))
+        if kind == 'cond':
+            index = self.rng.choice(self.closed_groups)[0]
+            no = self._seq(depth - 1, True) if self.rng.random() < 0.5 \
+                else None
+            return ('cond', index, self._seq(depth - 1, True), no)
+        if kind == 'assert':
+            return self._assert()
+
+    def _char(self):
+        kinds = ['literal'] * 4 + ['any', 'category', 'set', 'set']
+        kind = self.rng.choice(kinds)
+        if kind == 'literal':
+            return ('literal', self.rng.choice(self.ALPHABET))
+        if kind == 'any':
+            return ('any',)
+        if kind == 'category':
+            return ('category', self.rng.choice(self.CATEGORIES))
+        return self._set()
+
+    def _assert(self):
+        kind = self.rng.choice(['=', '=', '!', '!', '<=', '<!'])
+        # lookbehinds have to be fixed-width
+        nodes = [self._char() for _ in range(self.rng.randint(1, 2))]
+        if not kind.startswith('<') and self.rng.random() < 0.5:
+            nodes.insert(0, ('repeat', ('any',), 0, None, False))
+        return ('assert', kind, ('seq', nodes))
+
+    def _set(self):
+        negate = self.rng.random() < 0.25
+        kinds = ['char', 'char', 'range'] + ([] if negate else ['category'])
+
+        items = []
+        for _ in range(self.rng.randint(1, 3)):
+            kind = self.rng.choice(kinds)
+            if kind == 'char':
+                items.append(('char', self.rng.choice(self.ALPHABET)))
+            elif kind == 'range':
+                a, b = sorted(self.rng.sample(string.ascii_letters, 2))
+                items.append(('range', a, b))
+            else:
+                items.append(('category', self.rng.choice(self.CATEGORIES)))
+        return ('set', negate, items)
+
+    def _alt(self, depth, optional):
+        count = self.rng.randint(2, 3)
+        return ('alt', [self._seq(depth, True) for _ in range(count)])
+
+    def _group(self, depth, optional, child_func):
+        kind = self.rng.choice(['capture', 'named', 'noncapture'])
+        if kind == 'noncapture':
+            return ('group', False, child_func(depth, optional))
+
+        self.group_count += 1
+        index = self.group_count
+        name = 'g%d' % index if kind == 'named' else None
+        child = child_func(depth, optional)
+        self.closed_groups.append((index, optional))
+        return ('group', name, child)
+
+    def _repeat(self, depth, optional):
+        min_count = self.rng.choice([0, 0, 1, 1, 2, 3])
+        max_count = self.rng.choice([None, None, min_count, min_count + 2])
+        lazy = self.rng.random() < 0.2
+
+        self.in_repeat = True
+        try:
+            child = self._group(depth, optional or min_count == 0, self._seq) \
+                if self.rng.random() < 0.3 else self._node(0, optional)
+        finally:
+            self.in_repeat = False
+        return ('repeat', child, min_count, max_count, lazy)
+
+
+def render(tree):
+    """Turn tree generated by :class:`RegexGenerator` into pattern string."""
+    kind = tree[0]
+
+    if kind == 'literal':
+        return re.escape(tree[1])
+    if kind == 'any':
+        return '.'
+    if kind == 'category':
+        return '\\' + tree[1]
+    if kind == 'set':
+        _, negate, items = tree
+        rendered = []
+        for item in items:
+            if item[0] == 'char':
+                rendered.append(re.escape(item[1]))
+            elif item[0] == 'range':
+                rendered.append('%s-%s' % item[1:])
+            else:
+                rendered.append('\\' + item[1])
+        return '[%s%s]' % ('^' if negate else '', ''.join(rendered))
+
+    if kind == 'seq':
+        return ''.join(map(render, tree[1]))
+    if kind == 'alt':
+        return '|'.join(map(render, tree[1]))
+    if kind == 'group':
+        _, name, child = tree
+        if name is False:
+            return '(?:%s)' % render(child)
+        if name is None:
+            return '(%s)' % render(child)
+        return '(?P<%s>%s)' % (name, render(child))
+    if kind == 'repeat':
+        _, child, min_count, max_count, lazy = tree
+        rendered = render(child)
+        if child[0] in ('seq', 'alt', 'repeat'):
+            rendered = '(?:%s)' % rendered
+        if max_count is None:
+            quantifier = {0: '*', 1: '+'}.get(min_count, '{%d,}' % min_count)
+        elif max_count == min_count:
+            quantifier = '{%d}' % min_count
+        else:
+            quantifier = '{%d,%d}' % (min_count, max_count)
+        return rendered + quantifier + ('?' if lazy else '')
+    if kind == 'backref':
+        return '(?:\\%d)' % tree[1]
+    if kind == 'cond':
+        _, index, yes, no = tree
+        if no is None:
+            return '(?(%d)%s)' % (index, render(yes))
+        return '(?(%d)%s|%s)' % (index, render(yes), render(no))
+    if kind == 'assert':
+        return '(?%s%s)' % (tree[1], render(tree[2]))
+
+    raise ValueError("invalid tree node: %r" % (tree,))
+
+
+def encode(pattern, as_bytes):
+    """Turn rendered pattern into a bytes one, if requested.
+    Generated patterns only contain ASCII characters.
+    """
+    return pattern.encode('ascii') if as_bytes else pattern
+
+
+# Shrinking failing patterns
+
+def shrink(tree, seed, samples, flags=0, as_bytes=False, max_steps=1000):
+    """Shrink the tree of a failing pattern, for as long as
+    the resulting pattern still fails the checks.
+    """
+    def fails(tree):
+        failure = check_pattern(encode(render(tree), as_bytes), seed, samples,
+                                flags)
+        # candidates can be invalid, e.g. when referring to removed groups
+        return failure is not None and failure['function'] != 're.compile'
+
+    for _ in range(max_steps):
+        for candidate in shrink_candidates(tree):
+            if fails(candidate):
+                tree = candidate
+                break
+        else:
+            break  # no smaller failing tree
+    return tree
+
+
+def shrink_candidates(tree):
+    """Generate trees that are simpler than given one,
+    from the simplest to the most similar one.
+    """
+    kind = tree[0]
+    children = []
+
+    if kind in ('seq', 'alt'):
+        nodes = tree[1]
+        children = list(nodes)
+        min_length = 1 if kind == 'seq' else 2
+        if len(nodes) > min_length:
+            for i in range(len(nodes)):
+                yield (kind, nodes[:i] + nodes[i + 1:])
+    elif kind == 'group':
+        children = [tree[2]]
+        if tree[1] is not False:
+            yield ('group', False, tree[2])
+    elif kind == 'assert':
+        children = [tree[2]]
+    elif kind == 'repeat':
+        _, child, min_count, max_count, lazy = tree
+        children = [child]
+        if lazy:
+            yield ('repeat', child, min_count, max_count, False)
+        if max_count is None:
+            yield ('repeat', child, min_count, min_count + 1, lazy)
+    elif kind == 'cond':
+        _, index, yes, no = tree
+        children = [yes] + ([no] if no else [])
+        if no is not None:
+            yield ('cond', index, yes, None)
+    elif kind == 'set':
+        _, negate, items = tree
+        if len(items) > 1:
+            for i in range(len(items)):
+                yield ('set', negate, items[:i] + items[i + 1:])
+
+    for child in children:
+        yield child
+
+    # recursively shrink the children in place
+    if kind in ('seq', 'alt'):
+        nodes = tree[1]
+        for i, node in enumerate(nodes):
+            for candidate in shrink_candidates(node):
+                yield (kind, nodes[:i] + [candidate] + nodes[i + 1:])
+    elif kind in ('group', 'assert'):
+        for candidate in shrink_candidates(tree[2]):
+            yield (kind, tree[1], candidate)
+    elif kind == 'repeat':
+        for candidate in shrink_candidates(tree[1]):
+            yield ('repeat', candidate) + tuple(tree[2:])
+    elif kind == 'cond':
+        for candidate in shrink_candidates(tree[2]):
+            yield ('cond', tree[1], candidate, tree[3])
+        if tree[3] is not None:
+            for candidate in shrink_candidates(tree[3]):
+                yield ('cond', tree[1], tree[2], candidate)
+
+
+if __name__ == '__main__':
+    sys.exit(main())